@@ -0,0 +1,240 @@
+"""قياس أداء منطق الحضور على بيانات مولّدة بأحجام مختلفة (بدون واجهة رسومية)
+
+أمثلة:
+    python attendance_bench.py generate --data-dir demo --employees 200 --years 3
+    python attendance_bench.py run --employees 50 500 --years 1 3 --backend json sqlite --output bench.csv
+"""
+import argparse
+import csv
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from attendance_core import (
+    SNAPSHOT_ENCODINGS, STORAGE_BACKENDS, STORAGE_FORMAT_VERSION, build_daily_report, build_monthly_report,
+    build_payroll_report, open_storage, partition_stats, to_timestamp, with_hourly_rate, write_snapshot,
+)
+
+DEPARTMENTS = ['المبيعات', 'المحاسبة', 'المخازن', 'الإنتاج', 'الإدارة']
+# أعمدة ملف النتائج (يُضاف إليه سطر لكل عملية في كل تشغيل لمتابعة التراجع في الأداء)
+RESULT_COLUMNS = ['run_at', 'machine', 'python', 'backend', 'employees', 'years', 'sessions_per_day',
+                  'sessions', 'operation', 'runs', 'median_ms', 'p95_ms', 'max_ms']
+
+
+def generate_dataset(data_dir, employees=100, years=1, sessions_per_day=1, seed=1, encoding='json'):
+    """كتابة بيانات مولّدة في مجلد بيانات جديد: عدد السنوات حتى أمس بدون أيام الجمعة
+    
+    الجلسات تُقسّم يوم العمل (8 صباحاً حتى 5 مساءً) مع تأخير عشوائي، وتُكتب ملفات الأشهر والفهرس
+    مباشرة بالصيغة الحالية. تُرجع عدد الجلسات.
+    """
+    rng = random.Random(seed)
+    partitions_dir = os.path.join(data_dir, 'attendance')
+    os.makedirs(partitions_dir)
+    
+    emp_ids = [str(1000 + i) for i in range(employees)]
+    write_snapshot(os.path.join(data_dir, 'employees.json'), {
+        emp_id: with_hourly_rate({'name': f"موظف {emp_id}", 'department': DEPARTMENTS[i % len(DEPARTMENTS)],
+                                  'monthly_salary': rng.randrange(3000, 15000, 100)})
+        for i, emp_id in enumerate(emp_ids)})
+    
+    slot = 9 * 3600 // sessions_per_day
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    day = today - timedelta(days=int(years * 365))
+    months = defaultdict(dict)
+    while day < today:
+        # الجمعة إجازة
+        if day.weekday() != 4:
+            start = to_timestamp(day) + 8 * 3600
+            date = day.strftime('%Y-%m-%d')
+            records = {}
+            for emp_id in emp_ids:
+                records[emp_id] = [
+                    [start + i * slot + rng.randrange(0, 900), start + (i + 1) * slot - rng.randrange(60, 900)]
+                    for i in range(sessions_per_day)]
+            months[date[:7]][date] = records
+        day += timedelta(days=1)
+    
+    partitions = {}
+    for month, days in months.items():
+        write_snapshot(os.path.join(partitions_dir, f'{month}.json'), days, encoding)
+        partitions[month] = partition_stats(days)
+    # كل موظف يحضر في كل الأشهر المولّدة
+    write_snapshot(os.path.join(partitions_dir, 'manifest.json'), {
+        'partitions': partitions, 'encoding': encoding,
+        'employee_months': {emp_id: sorted(months) for emp_id in emp_ids}})
+    return sum(info['sessions'] for info in partitions.values())
+
+
+def percentile(values, fraction):
+    """القيمة عند نسبة معينة من القيم المرتبة (أقرب رتبة)"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Timer:
+    """تجميع أزمنة كل عملية بالميلي ثانية"""
+    
+    def __init__(self):
+        self.samples = defaultdict(list)
+    
+    def measure(self, operation, func, *args):
+        """تنفيذ الدالة وتسجيل زمنها، وإرجاع نتيجتها"""
+        start = time.perf_counter()
+        result = func(*args)
+        self.samples[operation].append((time.perf_counter() - start) * 1000)
+        return result
+
+
+def run_operations(backend, data_dir, repeat, punches):
+    """قياس عمليات التشغيل اليومي والتقارير على مجلد بيانات مولّد"""
+    timer = Timer()
+    # أول فتح لـ SQLite ينقل البيانات إلى القاعدة، فلا يُحسب مع التحميل
+    open_storage(backend, data_dir).close()
+    
+    for _ in range(repeat):
+        storage = timer.measure('load_data', open_storage, backend, data_dir)
+        storage.close()
+    
+    storage = open_storage(backend, data_dir)
+    try:
+        if hasattr(storage, 'load_all'):
+            timer.measure('load_all_months', storage.load_all)
+        
+        emp_ids = sorted(storage.employees)
+        sample = emp_ids[:punches]
+        now = datetime.now()
+        today = now.strftime('%Y-%m-%d')
+        last_month_end = now.replace(day=1) - timedelta(days=1)
+        month_start = last_month_end.replace(day=1).strftime('%Y-%m-%d')
+        month_end = last_month_end.strftime('%Y-%m-%d')
+        year_start = (now - timedelta(days=365)).strftime('%Y-%m-%d')
+        
+        base = to_timestamp(now.replace(hour=0, minute=0, second=0, microsecond=0))
+        for run in range(repeat):
+            # جلسات قصيرة متتالية اليوم حتى لا تتداخل مع جلسات التشغيلات السابقة
+            check_in = base + run * 120
+            for emp_id in sample:
+                if timer.measure('has_open_checkin', storage.find_open_session, emp_id) is None:
+                    timer.measure('check_in', storage.add_check_in, emp_id, today, check_in)
+            for emp_id in sample:
+                session = storage.find_open_session(emp_id)
+                timer.measure('check_out', storage.close_session, session, check_in + 60)
+            
+            def update_daily_attendance():
+                storage.refresh()
+                return storage.sessions_on(today)
+            timer.measure('update_daily_attendance', update_daily_attendance)
+            timer.measure('daily_report', build_daily_report, storage, today)
+            timer.measure('monthly_report', build_monthly_report, storage, emp_ids[run % len(emp_ids)],
+                          month_start, month_end, month_start[:7])
+            timer.measure('payroll_report_year', build_payroll_report, storage, year_start, today, '', 'year')
+            timer.measure('save_data', storage.save)
+        
+        timer.measure('archive_employee', storage.archive_employee, emp_ids[-1])
+        timer.measure('purge_employee', storage.remove_employee, emp_ids[-1])
+    finally:
+        storage.close()
+    return timer.samples
+
+
+def print_results(rows, out=sys.stdout):
+    """طباعة النتائج كجدول مفصول بـ Tab"""
+    columns = RESULT_COLUMNS[3:]
+    print('\t'.join(columns), file=out)
+    for row in rows:
+        print('\t'.join(str(row[column]) for column in columns), file=out)
+
+
+def append_results(path, rows):
+    """إضافة النتائج إلى ملف CSV (مع سطر العناوين إذا كان الملف جديداً)"""
+    new_file = not os.path.exists(path)
+    with open(path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+        if new_file:
+            writer.writeheader()
+        writer.writerows(rows)
+
+
+def run_benchmarks(args):
+    """تشغيل القياسات لكل حجم بيانات ونوع تخزين"""
+    run_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    machine = f"{platform.node()} {platform.machine()} {os.cpu_count()} cpu"
+    rows = []
+    for employees in args.employees:
+        for years in args.years:
+            for backend in args.backend:
+                data_dir = tempfile.mkdtemp(prefix='attendance_bench_')
+                try:
+                    sessions = generate_dataset(data_dir, employees, years, args.sessions_per_day,
+                                                args.seed, args.encoding)
+                    samples = run_operations(backend, data_dir, args.repeat, args.punches)
+                finally:
+                    shutil.rmtree(data_dir, ignore_errors=True)
+                
+                for operation, values in samples.items():
+                    rows.append({
+                        'run_at': run_at, 'machine': machine, 'python': platform.python_version(),
+                        'backend': backend, 'employees': employees, 'years': years,
+                        'sessions_per_day': args.sessions_per_day, 'sessions': sessions,
+                        'operation': operation, 'runs': len(values),
+                        'median_ms': round(percentile(values, 0.5), 3),
+                        'p95_ms': round(percentile(values, 0.95), 3),
+                        'max_ms': round(max(values), 3),
+                    })
+    return rows
+
+
+def build_parser():
+    """إنشاء محلل الأوامر"""
+    parser = argparse.ArgumentParser(description="قياس أداء نظام الحضور والانصراف")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    generate = commands.add_parser('generate', help="توليد مجلد بيانات تجريبي")
+    generate.add_argument('--data-dir', required=True, help="مجلد البيانات (يجب ألا يكون موجوداً)")
+    generate.add_argument('--employees', type=int, default=100, help="عدد الموظفين")
+    generate.add_argument('--years', type=float, default=1, help="عدد سنوات السجل")
+    
+    run = commands.add_parser('run', help="قياس العمليات على بيانات مولّدة بأحجام مختلفة")
+    run.add_argument('--employees', type=int, nargs='+', default=[50, 500], help="أعداد الموظفين")
+    run.add_argument('--years', type=float, nargs='+', default=[1, 3], help="أعداد سنوات السجل")
+    run.add_argument('--backend', choices=STORAGE_BACKENDS, nargs='+', default=list(STORAGE_BACKENDS),
+                     help="أنواع التخزين")
+    run.add_argument('--repeat', type=int, default=5, help="عدد مرات تكرار كل عملية")
+    run.add_argument('--punches', type=int, default=20, help="عدد الموظفين الذين يبصمون في كل تكرار")
+    run.add_argument('--output', help="ملف CSV تُضاف إليه النتائج")
+    
+    for command in (generate, run):
+        command.add_argument('--sessions-per-day', type=int, default=1, help="عدد الجلسات لكل موظف في اليوم")
+        command.add_argument('--encoding', choices=SNAPSHOT_ENCODINGS, default='json', help="ترميز ملفات الأشهر")
+        command.add_argument('--seed', type=int, default=1, help="بذرة التوليد العشوائي")
+    return parser
+
+
+def main(argv=None):
+    """نقطة الدخول: تُرجع 0 عند النجاح و2 عند خطأ في المدخلات"""
+    args = build_parser().parse_args(argv)
+    
+    if args.command == 'generate':
+        if os.path.exists(args.data_dir):
+            print(f"خطأ: المجلد {args.data_dir} موجود بالفعل", file=sys.stderr)
+            return 2
+        sessions = generate_dataset(args.data_dir, args.employees, args.years, args.sessions_per_day,
+                                    args.seed, args.encoding)
+        print(f"تم توليد {args.employees} موظف و{sessions} جلسة (صيغة الملفات {STORAGE_FORMAT_VERSION})")
+        return 0
+    
+    rows = run_benchmarks(args)
+    print_results(rows)
+    if args.output:
+        append_results(args.output, rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
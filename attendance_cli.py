@@ -0,0 +1,259 @@
+"""تشغيل التقارير وتصديرها من سطر الأوامر بدون واجهة رسومية (مناسب للمهام المجدولة)
+
+أمثلة:
+    python attendance_cli.py report daily --date 2024-05-01
+    python attendance_cli.py report period --from 2024-05-01 --to 2024-05-31 --dept المبيعات
+    python attendance_cli.py export --format xlsx --output payroll.xlsx period --from 2024-05-01 --to 2024-05-31
+    python attendance_cli.py migrate
+    python attendance_cli.py convert --to binary
+    python attendance_cli.py rebuild-rollups
+    python attendance_cli.py rebuild-rollups --verify
+    python attendance_cli.py archive 1001
+    python attendance_cli.py purge 1001
+    python attendance_cli.py import attlog.dat --rejected rejected.csv
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+
+from attendance_core import (
+    EXPORT_WRITERS, METRICS, SNAPSHOT_ENCODINGS, STORAGE_BACKENDS, STORAGE_FORMAT_VERSION, StorageConflict,
+    StorageFormatError, build_daily_report, build_monthly_report, build_payroll_report, convert_json_storage,
+    format_report_value, import_punch_file, json_storage_version, migrate_json_storage, open_storage, verify_rollups,
+    write_rejected_punches,
+)
+
+
+def parse_date(text):
+    """التحقق من صيغة التاريخ YYYY-MM-DD"""
+    try:
+        datetime.strptime(text, '%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"صيغة التاريخ غير صحيحة: {text}. استخدم YYYY-MM-DD")
+    return text
+
+
+def parse_milliseconds(text):
+    """التحقق من أن المدة عدد صحيح غير سالب من الملّي ثانية"""
+    if not text.isdigit():
+        raise argparse.ArgumentTypeError(f"مدة غير صالحة: {text} (عدد صحيح من الملّي ثانية)")
+    return int(text)
+
+
+def add_report_arguments(parser):
+    """إضافة أنواع التقارير (daily و period) كأوامر فرعية"""
+    reports = parser.add_subparsers(dest='report', required=True)
+    
+    daily = reports.add_parser('daily', help="التقرير اليومي")
+    daily.add_argument('--date', type=parse_date, default=datetime.now().strftime('%Y-%m-%d'),
+                       help="تاريخ التقرير (الافتراضي اليوم)")
+    
+    period = reports.add_parser('period', help="تقرير الرواتب لفترة، أو تقرير موظف واحد مع --emp")
+    period.add_argument('--from', dest='start_date', type=parse_date, required=True, help="تاريخ البداية")
+    period.add_argument('--to', dest='end_date', type=parse_date, required=True, help="تاريخ النهاية")
+    period.add_argument('--dept', default='', help="القسم (الافتراضي كل الأقسام)")
+    period.add_argument('--emp', default='', help="كود موظف لعرض تقريره خلال الفترة بدلاً من تقرير الرواتب")
+
+
+def build_parser():
+    """إنشاء محلل الأوامر"""
+    parser = argparse.ArgumentParser(description="تقارير نظام الحضور والانصراف")
+    parser.add_argument('--data-dir', default='data', help="مجلد البيانات")
+    parser.add_argument('--backend', choices=STORAGE_BACKENDS, default='json', help="نوع التخزين")
+    parser.add_argument('--commit-window-ms', type=parse_milliseconds, default=0,
+                        help="لتخزين JSON: مدة إضافية لتجميع البصمات في fsync واحد (الافتراضي 0)")
+    parser.add_argument('--metrics', help="ملف JSON يُكتب فيه ملخص أزمنة العمليات بعد التنفيذ")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    report = commands.add_parser('report', help="طباعة تقرير")
+    add_report_arguments(report)
+    
+    export = commands.add_parser('export', help="تصدير تقرير إلى ملف")
+    export.add_argument('--format', choices=sorted(EXPORT_WRITERS), required=True, help="صيغة الملف")
+    export.add_argument('--output', required=True, help="مسار الملف")
+    add_report_arguments(export)
+    
+    commands.add_parser('migrate', help="ترحيل ملفات الحضور إلى الصيغة الحالية (مرة واحدة)")
+    
+    convert = commands.add_parser('convert', help="إعادة كتابة ملفات الأشهر بترميز JSON أو الترميز الثنائي المضغوط")
+    convert.add_argument('--to', dest='encoding', choices=SNAPSHOT_ENCODINGS, required=True, help="الترميز الجديد")
+    
+    rollups = commands.add_parser('rebuild-rollups', help="إعادة بناء ملخصات الساعات والرواتب من جلسات الحضور")
+    rollups.add_argument('--verify', action='store_true',
+                         help="مقارنة الملخصات الحالية بالحساب من الجلسات بدون إعادة بنائها")
+    
+    archive = commands.add_parser('archive', help="أرشفة موظف: يتوقف عن التسجيل وتبقى سجلاته في التقارير")
+    archive.add_argument('emp_id', help="كود الموظف")
+    archive.add_argument('--restore', action='store_true', help="إعادة تفعيل موظف مؤرشف")
+    
+    purge = commands.add_parser('purge', help="حذف موظف نهائياً مع كل سجلات حضوره")
+    purge.add_argument('emp_id', help="كود الموظف")
+    
+    punches = commands.add_parser('import', help="استيراد بصمات من سجل جهاز البصمة أو ملف CSV")
+    punches.add_argument('file', help="ملف البصمات")
+    punches.add_argument('--rejected', help="ملف CSV لكتابة الصفوف المرفوضة (الافتراضي طباعتها)")
+    return parser
+
+
+def build_report(storage, args):
+    """حساب التقرير المطلوب من معاملات سطر الأوامر"""
+    if args.report == 'daily':
+        return build_daily_report(storage, args.date)
+    
+    if args.start_date > args.end_date:
+        raise ValueError("تاريخ البداية يجب أن يكون أقل من تاريخ النهاية")
+    
+    period_label = f"{args.start_date} إلى {args.end_date}"
+    if args.emp:
+        if args.emp not in storage.employees:
+            raise ValueError("كود الموظف غير مسجل")
+        return build_monthly_report(storage, args.emp, args.start_date, args.end_date, period_label)
+    return build_payroll_report(storage, args.start_date, args.end_date, args.dept, period_label)
+
+
+def print_report(result, out=sys.stdout):
+    """طباعة التقرير كأعمدة مفصولة بـ Tab"""
+    print(result.title, file=out)
+    print('\t'.join(result.headers), file=out)
+    for values, _ in result.rows:
+        print('\t'.join(str(format_report_value(value)) for value in values), file=out)
+
+
+def partitions_size(data_dir):
+    """الحجم الكلي لملفات الأشهر بالبايت"""
+    partitions_dir = os.path.join(data_dir, 'attendance')
+    if not os.path.exists(partitions_dir):
+        return 0
+    return sum(os.path.getsize(os.path.join(partitions_dir, name))
+               for name in os.listdir(partitions_dir) if name.endswith('.json'))
+
+
+def import_punches(storage, args):
+    """استيراد ملف بصمات وعرض الصفوف المرفوضة"""
+    try:
+        imported, rejected = import_punch_file(storage, args.file)
+    except (OSError, ValueError, StorageConflict) as e:
+        print(f"خطأ: {e}", file=sys.stderr)
+        return 2
+    
+    print(f"تم تسجيل {imported} حدث حضور وانصراف، ورفض {len(rejected)} سطر")
+    if args.rejected:
+        write_rejected_punches(args.rejected, rejected)
+    else:
+        for line_no, text, reason in rejected:
+            print(f"{line_no}: {reason}: {text}", file=sys.stderr)
+    return 0
+
+
+def manage_employee(storage, args):
+    """أرشفة موظف أو إعادة تفعيله أو حذفه نهائياً"""
+    if args.emp_id not in storage.employees:
+        print("خطأ: كود الموظف غير مسجل", file=sys.stderr)
+        return 2
+    
+    if args.command == 'purge':
+        storage.remove_employee(args.emp_id)
+        print(f"تم حذف الموظف {args.emp_id} وكل سجلات حضوره")
+        return 0
+    
+    try:
+        storage.archive_employee(args.emp_id, not args.restore)
+    except StorageConflict as e:
+        print(f"خطأ: {e}", file=sys.stderr)
+        return 2
+    print(f"تم إعادة تفعيل الموظف {args.emp_id}" if args.restore else f"تم أرشفة الموظف {args.emp_id}")
+    return 0
+
+
+def print_rollup_mismatches(mismatches):
+    """طباعة اختلافات الملخصات عن الجلسات: تُرجع 0 إذا تطابقت و1 إذا اختلفت"""
+    if not mismatches:
+        print("الملخصات مطابقة للحساب من الجلسات")
+        return 0
+    print("الشهر\tكود الموظف\tمن الملخصات (أيام، ساعات، راتب)\tمن الجلسات")
+    for month, emp_id, from_rollups, from_sessions in mismatches:
+        print(f"{month}\t{emp_id}\t{from_rollups}\t{from_sessions}")
+    print(f"عدد الاختلافات: {len(mismatches)}، شغّل rebuild-rollups لإعادة بنائها", file=sys.stderr)
+    return 1
+
+
+def run_command(args):
+    """تنفيذ الأمر المطلوب: تُرجع 0 عند النجاح و1 إذا لم توجد بيانات أو فشل التصدير و2 عند خطأ في المدخلات"""
+    try:
+        if args.command == 'migrate':
+            version = json_storage_version(args.data_dir)
+            migrate_json_storage(args.data_dir)
+            print(f"صيغة ملفات الحضور: {version} -> {STORAGE_FORMAT_VERSION}")
+            return 0
+        
+        if args.command == 'convert':
+            migrate_json_storage(args.data_dir)
+            old_size = partitions_size(args.data_dir)
+            convert_json_storage(args.data_dir, args.encoding)
+            print(f"حجم ملفات الأشهر: {old_size} -> {partitions_size(args.data_dir)} بايت")
+            return 0
+        
+        storage = open_storage(args.backend, args.data_dir, args.commit_window_ms)
+    except StorageFormatError as e:
+        print(f"خطأ: {e}", file=sys.stderr)
+        return 2
+    
+    if args.command == 'import':
+        try:
+            return import_punches(storage, args)
+        finally:
+            storage.close()
+    
+    if args.command in ('archive', 'purge'):
+        try:
+            return manage_employee(storage, args)
+        finally:
+            storage.close()
+    
+    if args.command == 'rebuild-rollups':
+        try:
+            if args.verify:
+                return print_rollup_mismatches(verify_rollups(storage))
+            storage.rebuild_rollups()
+        finally:
+            storage.close()
+        print("تم إعادة بناء ملخصات الساعات والرواتب")
+        return 0
+    
+    try:
+        result = build_report(storage, args)
+    except ValueError as e:
+        print(f"خطأ: {e}", file=sys.stderr)
+        return 2
+    finally:
+        storage.close()
+    
+    if not result.rows:
+        print("لا توجد بيانات", file=sys.stderr)
+        return 1
+    
+    if args.command == 'report':
+        print_report(result)
+    else:
+        try:
+            EXPORT_WRITERS[args.format](args.output, result)
+        except Exception as e:
+            print(f"حدث خطأ أثناء التصدير: {e}", file=sys.stderr)
+            return 1
+        print(f"تم تصدير التقرير إلى {args.output}")
+    return 0
+
+
+def main(argv=None):
+    """نقطة الدخول: تنفيذ الأمر ثم كتابة ملخص القياسات إذا طُلب"""
+    args = build_parser().parse_args(argv)
+    try:
+        return run_command(args)
+    finally:
+        if args.metrics:
+            METRICS.dump(args.metrics)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
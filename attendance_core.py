@@ -0,0 +1,2581 @@
+"""منطق الحضور والرواتب والتقارير بدون أي واجهة رسومية (يستخدمه البرنامج وسطر الأوامر)"""
+from datetime import datetime, timedelta
+import os
+import re
+import sys
+import csv
+import json
+import sqlite3
+import hashlib
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from itertools import accumulate, groupby
+from operator import attrgetter, itemgetter
+
+
+# حدود فترات مدرج الأزمنة بالثواني: من 1 ميكروثانية حتى حوالي 100 ثانية بزيادة 25% لكل فترة
+_LATENCY_BOUNDS = [1e-6 * 1.25 ** i for i in range(83)]
+
+
+class LatencyHistogram:
+    """مدرج أزمنة بفترات لوغاريتمية: ذاكرته ثابتة مهما زاد عدد القياسات"""
+    
+    __slots__ = ('counts', 'count', 'total', 'max')
+    
+    def __init__(self):
+        self.counts = [0] * (len(_LATENCY_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def add(self, seconds):
+        """إضافة قياس"""
+        self.counts[bisect_left(_LATENCY_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+    
+    def percentile(self, fraction):
+        """تقدير الزمن عند نسبة من القياسات بالاستيفاء داخل فترته (الخطأ أقل من عرض الفترة 25%)"""
+        rank = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = _LATENCY_BOUNDS[i - 1] if i else 0.0
+                upper = _LATENCY_BOUNDS[i] if i < len(_LATENCY_BOUNDS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+    
+    def summary(self):
+        """عدد القياسات والمتوسط وp50 وp95 وp99 والأقصى بالميلي ثانية"""
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count * 1000, 3) if self.count else 0,
+            'p50_ms': round(self.percentile(0.50) * 1000, 3),
+            'p95_ms': round(self.percentile(0.95) * 1000, 3),
+            'p99_ms': round(self.percentile(0.99) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+        }
+
+
+class Metrics:
+    """قياس أزمنة العمليات المهمة (البصمات والحفظ والبحث والتقارير والتصدير) في مدرجات أزمنة
+    
+    عند الإيقاف (enabled = False أو متغير البيئة ATTENDANCE_METRICS=0) لا يتم قياس أي شيء.
+    """
+    
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.histograms = {}
+    
+    def record(self, name, seconds):
+        """إضافة زمن عملية إلى مدرجها"""
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.add(seconds)
+    
+    @contextmanager
+    def span(self, name):
+        """قياس زمن جزء من الكود: with METRICS.span('name'): ..."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+    
+    def timed(self, name):
+        """مزخرف لقياس زمن كل استدعاء لدالة"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+    
+    def summary(self):
+        """ملخص كل المدرجات: {اسم العملية: ملخص المدرج}"""
+        with self.lock:
+            return {name: self.histograms[name].summary() for name in sorted(self.histograms)}
+    
+    def reset(self):
+        """حذف كل القياسات"""
+        with self.lock:
+            self.histograms = {}
+    
+    def dump(self, path):
+        """كتابة ملخص القياسات في ملف JSON"""
+        data = {'written_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'metrics': self.summary()}
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+# القياسات المشتركة لكل البرنامج
+METRICS = Metrics(enabled=os.environ.get('ATTENDANCE_METRICS', '1') != '0')
+
+
+class FileLock:
+    """قفل استشاري على ملف يمنع أكثر من جهاز (أو نسخة من البرنامج) من الكتابة في مجلد البيانات معاً
+    
+    يمكن أخذه أكثر من مرة من نفس الخيط، ولا يُفك إلا بعد آخر release.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._file = None
+        self._depth = 0
+    
+    def acquire(self):
+        """الانتظار حتى يصبح القفل متاحاً ثم أخذه"""
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            self._file = open(self.path, 'a+b')
+            if os.name == 'nt':
+                import msvcrt
+                self._file.seek(0)
+                while True:
+                    try:
+                        # LK_LOCK يحاول لمدة 10 ثوان ثم يرفع خطأ فنعيد المحاولة
+                        msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        self._depth += 1
+    
+    def release(self):
+        """فك القفل"""
+        self._depth -= 1
+        if self._depth == 0:
+            if os.name == 'nt':
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class PunchJournal:
+    """سجل إلحاقي للأحداث (سطر لكل حدث) مع تجميع عمليات fsync
+    
+    أول سطر في السجل يحمل رقم جيل يتغير عند كل تفريغ، حتى يعرف كل جهاز يتابع السجل
+    أن جهازاً آخر قد دمجه في ملفات البيانات. القراءة والكتابة تتم تحت FileLock.
+    
+    الحدث لا يُعتبر محفوظاً قبل wait_synced: أول من ينتظر ينفذ fsync واحداً لكل ما أُضيف حتى
+    تلك اللحظة، والأحداث التي تُضاف أثناءه تُثبّت معاً في fsync التالي. commit_window مدة
+    إضافية (بالثواني) ينتظرها أول المنتظرين لتجميع أحداث أكثر، والقيمة 0 تعني fsync فوراً.
+    """
+    
+    def __init__(self, path, commit_window=0):
+        self.path = path
+        self.commit_window = commit_window
+        self.entries = 0
+        # رقم الجيل وعدد البايتات المقروءة حتى الآن من السجل
+        self.generation = None
+        self.offset = 0
+        self._file = None
+        # عدد الأحداث المضافة وعدد ما ثُبّت منها على القرص، وهل يوجد fsync جارٍ الآن
+        self._appended = 0
+        self._synced = 0
+        self._syncing = False
+        self._io_lock = threading.Lock()
+        self._synced_changed = threading.Condition(self._io_lock)
+    
+    def _read_lines(self, f, events):
+        """قراءة الأسطر الكاملة من الموضع الحالي: (عدد البايتات السليمة, هل توجد كتابة مبتورة)"""
+        good = 0
+        for line in f:
+            if not line.endswith(b'\n'):
+                return good, True
+            if line.strip():
+                try:
+                    event = json.loads(line.decode('utf-8'))
+                except (UnicodeDecodeError, json.JSONDecodeError):
+                    return good, True
+                if event.get('type') == 'journal':
+                    self.generation = event['generation']
+                else:
+                    events.append(event)
+            good += len(line)
+        return good, False
+    
+    def read(self):
+        """قراءة أحداث السجل بالترتيب مع حذف السطر الأخير إذا كان مبتوراً"""
+        events = []
+        self.generation = None
+        self.offset = 0
+        torn = False
+        try:
+            with open(self.path, 'rb') as f:
+                self.offset, torn = self._read_lines(f, events)
+        except FileNotFoundError:
+            pass
+        
+        if torn:
+            # كتابة لم تكتمل بسبب انقطاع مفاجئ: نتجاهلها حتى لا تفسد الأحداث التالية
+            with open(self.path, 'r+b') as f:
+                f.truncate(self.offset)
+        
+        self.entries = len(events)
+        return events
+    
+    def read_new(self, repair=True):
+        """الأحداث التي أضافتها الأجهزة الأخرى منذ آخر قراءة، أو None إذا تم تفريغ السجل بعدها
+        
+        repair=False للقراءة بدون FileLock: السطر الأخير غير المكتمل يُترك كما هو (قد يكون جهاز
+        آخر يكتبه الآن) ويُقرأ في المرة التالية.
+        """
+        events = []
+        try:
+            with open(self.path, 'rb') as f:
+                first_line = f.readline()
+                generation = None
+                if first_line.endswith(b'\n') and b'"journal"' in first_line:
+                    generation = json.loads(first_line.decode('utf-8')).get('generation')
+                
+                f.seek(0, os.SEEK_END)
+                if generation != self.generation or f.tell() < self.offset:
+                    return None
+                
+                f.seek(self.offset)
+                good, torn = self._read_lines(f, events)
+                self.offset += good
+        except FileNotFoundError:
+            return None if self.offset else events
+        
+        if torn and repair:
+            # جهاز توقف فجأة أثناء الكتابة (لا أحد يكتب الآن لأن القفل معنا)
+            with open(self.path, 'r+b') as f:
+                f.truncate(self.offset)
+        
+        self.entries += len(events)
+        return events
+    
+    def append(self, event):
+        """إضافة حدث إلى نهاية السجل (يُثبّت على القرص عند wait_synced)"""
+        line = (json.dumps(event, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._io_lock:
+            if self._file is None:
+                self._file = open(self.path, 'ab')
+            self._file.write(line)
+            self._file.flush()
+            self.offset += len(line)
+            self.entries += 1
+            self._appended += 1
+    
+    def wait_synced(self):
+        """انتظار تثبيت كل الأحداث المضافة حتى الآن على القرص"""
+        with self._io_lock:
+            target = self._appended
+            while self._synced < target:
+                if self._syncing:
+                    self._synced_changed.wait()
+                    continue
+                self._syncing = True
+                try:
+                    if self.commit_window > 0:
+                        self._synced_changed.wait(self.commit_window)
+                    synced_through = self._appended
+                    # fsync بدون القفل حتى تستمر الإضافة أثناءه، و close ينتظر انتهاءه قبل إغلاق الملف
+                    fileno = self._file.fileno()
+                    self._io_lock.release()
+                    try:
+                        with METRICS.span('journal.fsync'):
+                            os.fsync(fileno)
+                    finally:
+                        self._io_lock.acquire()
+                    self._synced = max(self._synced, synced_through)
+                finally:
+                    self._syncing = False
+                    self._synced_changed.notify_all()
+    
+    def _sync_locked(self):
+        """تنفيذ fsync للأحداث المعلقة (مع الاحتفاظ بـ _io_lock)"""
+        if self._file is not None and self._synced < self._appended:
+            with METRICS.span('journal.fsync'):
+                os.fsync(self._file.fileno())
+        self._synced = self._appended
+        self._synced_changed.notify_all()
+    
+    def reset(self):
+        """تفريغ السجل بعد كتابة لقطة كاملة للبيانات، مع رقم جيل جديد"""
+        self.close()
+        self.generation = os.urandom(8).hex()
+        header = (json.dumps({'type': 'journal', 'generation': self.generation}) + '\n').encode('utf-8')
+        with open(self.path, 'wb') as f:
+            f.write(header)
+            f.flush()
+            os.fsync(f.fileno())
+        self.offset = len(header)
+        self.entries = 0
+    
+    def close(self):
+        """إغلاق ملف السجل بعد كتابة ما تبقى منه"""
+        with self._io_lock:
+            while self._syncing:
+                self._synced_changed.wait()
+            if self._file is not None:
+                self._sync_locked()
+                self._file.close()
+                self._file = None
+
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_timestamp(moment):
+    """تحويل datetime إلى عدد صحيح من الثواني (بالتوقيت المحلي كما هو)"""
+    return int((moment - _EPOCH).total_seconds())
+
+
+def parse_timestamp(text):
+    """تحويل نص الوقت المخزن إلى عدد صحيح من الثواني، أو None إذا كان فارغاً أو غير صالح"""
+    if not text:
+        return None
+    try:
+        moment = datetime.fromisoformat(text)
+    except ValueError:
+        try:
+            moment = datetime.strptime(text, TIME_FORMAT)
+        except ValueError:
+            return None
+    return to_timestamp(moment)
+
+
+def format_timestamp(timestamp):
+    """تحويل عدد الثواني إلى نص للعرض أو التصدير"""
+    if timestamp is None:
+        return ''
+    return (_EPOCH + timedelta(seconds=timestamp)).strftime(TIME_FORMAT)
+
+
+def session_hours(seconds):
+    """عدد ساعات جلسة من مدتها بالثواني مقرباً لمنزلتين (كل حسابات الساعات تمر من هنا)"""
+    return round(seconds / 3600, 2)
+
+
+class Session:
+    """جلسة حضور: أوقات الحضور والانصراف بالثواني، وعدد الساعات يُحسب مرة واحدة عند الانصراف"""
+    
+    __slots__ = ('emp_id', 'date', 'check_in', 'check_out', 'hours')
+    
+    def __init__(self, emp_id, date, check_in, check_out=None):
+        self.emp_id = emp_id
+        self.date = date
+        self.check_in = check_in
+        self.check_out = None
+        self.hours = None
+        if check_out is not None:
+            self.close(check_out)
+    
+    def close(self, check_out):
+        """تسجيل وقت الانصراف وحساب عدد الساعات"""
+        # الساعات أولاً: من يرى وقت الانصراف يجد الساعات محسوبة
+        self.hours = session_hours(check_out - self.check_in)
+        self.check_out = check_out
+    
+    @property
+    def is_open(self):
+        """هل الجلسة ما زالت بدون انصراف"""
+        return self.check_out is None
+    
+    def to_record(self):
+        """تحويل الجلسة إلى صيغة التخزين في ملفات الأشهر: [الحضور, الانصراف] بالثواني"""
+        return [self.check_in, self.check_out]
+
+
+# رقم صيغة ملفات الحضور الحالية (يُكتب في الفهرس وفي كل ملف شهر):
+# 0 = ملف attendance.json واحد، 1 = ملف لكل شهر بأوقات نصية، 2 = ملف لكل شهر بأوقات بالثواني،
+# 3 = مثل 2 لكن كل ملف (الفهرس والموظفين والأشهر) يبدأ بسطر رأس فيه رقم الصيغة وsha256 المحتوى
+STORAGE_FORMAT_VERSION = 3
+
+
+class StorageFormatError(Exception):
+    """ملفات البيانات بصيغة غير الصيغة الحالية (تحتاج ترحيل أو كتبها إصدار أحدث)"""
+
+
+class StorageCorrupted(StorageFormatError):
+    """ملف بيانات تالف لا يطابق checksum، فلا يتم تحميله بدلاً من البدء ببيانات فارغة"""
+
+
+class StorageConflict(Exception):
+    """العملية تتعارض مع تعديل سجله جهاز آخر (مثل حضور مسجل بالفعل من جهاز آخر)"""
+
+
+def sync_directory(path):
+    """تثبيت إعادة تسمية الملفات داخل مجلد على القرص (غير متاح ولا لازم على ويندوز)"""
+    if os.name != 'nt':
+        fd = os.open(path or '.', os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+# ترميز محتوى ملفات الأشهر: JSON أو الصيغة الثنائية العمودية (يُحفظ اختياره في الفهرس)
+SNAPSHOT_ENCODINGS = ('json', 'binary')
+# مدة الجلسة المفتوحة في الصيغة الثنائية
+_OPEN_DURATION = -2 ** 31
+
+
+def _align(offset):
+    """تقريب الموضع إلى مضاعف 4 بايت حتى تبدأ كل عمود على حد محاذٍ"""
+    return (offset + 3) & ~3
+
+
+def encode_partition(days):
+    """ترميز بيانات شهر بالصيغة الثنائية العمودية
+    
+    سطر JSON صغير فيه التواريخ وجدول أكواد الموظفين وأنواع الأعمدة، ثم أعمدة ثابتة العرض
+    ومحاذاة على 4 بايت (يمكن فتحها بـ mmap أو numpy.frombuffer مباشرة): فرق وقت الحضور عن
+    الجلسة السابقة (الجلسات مرتبة بوقت الحضور)، مدة الجلسة، رقم الموظف، ورقم التاريخ.
+    """
+    dates = sorted(days)
+    employees = sorted({emp_id for records in days.values() for emp_id in records})
+    date_index = {date: i for i, date in enumerate(dates)}
+    emp_index = {emp_id: i for i, emp_id in enumerate(employees)}
+    rows = sorted((check_in, emp_index[emp_id], date_index[date], check_out)
+                  for date, records in days.items()
+                  for emp_id, sessions in records.items()
+                  for check_in, check_out in sessions)
+    
+    base = rows[0][0] if rows else 0
+    check_ins = array('I')
+    durations = array('i')
+    previous = base
+    for check_in, _, _, check_out in rows:
+        check_ins.append(check_in - previous)
+        durations.append(_OPEN_DURATION if check_out is None else check_out - check_in)
+        previous = check_in
+    columns = [
+        ('check_in', check_ins),
+        ('duration', durations),
+        ('emp', array('H' if len(employees) < 2 ** 16 else 'I', (row[1] for row in rows))),
+        ('date', array('B', (row[2] for row in rows))),
+    ]
+    
+    meta = {'rows': len(rows), 'base': base, 'dates': dates, 'employees': employees,
+            'byteorder': sys.byteorder, 'columns': [[name, column.typecode] for name, column in columns]}
+    body = bytearray(json.dumps(meta, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n')
+    for _, column in columns:
+        body.extend(bytes(_align(len(body)) - len(body)))
+        body.extend(column.tobytes())
+    return bytes(body)
+
+
+def decode_partition(body):
+    """فك ترميز ملف شهر بالصيغة الثنائية إلى {التاريخ: {كود الموظف: [[الحضور, الانصراف]]}}"""
+    meta_line = body[:body.index(b'\n')]
+    meta = json.loads(meta_line)
+    view = memoryview(body)
+    offset = len(meta_line) + 1
+    columns = {}
+    for name, typecode in meta['columns']:
+        column = array(typecode)
+        offset = _align(offset)
+        size = column.itemsize * meta['rows']
+        column.frombytes(view[offset:offset + size])
+        if meta['byteorder'] != sys.byteorder:
+            column.byteswap()
+        columns[name] = column
+        offset += size
+    
+    check_ins = accumulate(columns['check_in'], initial=meta['base'])
+    next(check_ins)
+    dates = meta['dates']
+    employees = meta['employees']
+    days = {}
+    for check_in, duration, emp, date in zip(check_ins, columns['duration'], columns['emp'], columns['date']):
+        check_out = None if duration == _OPEN_DURATION else check_in + duration
+        days.setdefault(dates[date], {}).setdefault(employees[emp], []).append([check_in, check_out])
+    return days
+
+
+@METRICS.timed('snapshot.write')
+def write_snapshot(path, data, encoding='json'):
+    """كتابة ملف بيانات: سطر رأس (رقم الصيغة والترميز وsha256 المحتوى) ثم المحتوى
+    
+    الكتابة في ملف مؤقت ثم استبداله، فانقطاع الكهرباء يترك الملف القديم أو الجديد كاملاً.
+    الترميز 'binary' لملفات الأشهر فقط.
+    """
+    if encoding == 'binary':
+        body = encode_partition(data)
+    else:
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    header = {'format_version': STORAGE_FORMAT_VERSION, 'encoding': encoding,
+              'sha256': hashlib.sha256(body).hexdigest()}
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(json.dumps(header).encode('utf-8') + b'\n')
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    sync_directory(os.path.dirname(path))
+
+
+@METRICS.timed('snapshot.read')
+def read_snapshot(path):
+    """قراءة ملف بيانات مع التحقق من checksum: (رقم الصيغة, المحتوى)
+    
+    الملفات المكتوبة قبل الصيغة 3 (بدون سطر رأس) تُقرأ كـ JSON عادي ورقم صيغتها من محتواها.
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    
+    first_line, _, body = raw.partition(b'\n')
+    try:
+        header = json.loads(first_line)
+    except ValueError:
+        header = None
+    
+    if isinstance(header, dict) and 'sha256' in header:
+        if hashlib.sha256(body).hexdigest() != header['sha256']:
+            raise StorageCorrupted(f"الملف {path} تالف (المحتوى لا يطابق checksum)")
+        if header.get('encoding') == 'binary':
+            return header['format_version'], decode_partition(body)
+        return header['format_version'], json.loads(body)
+    
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        raise StorageCorrupted(f"الملف {path} تالف (ليس JSON صالحاً)")
+    return (data.get('format_version', 1) if isinstance(data, dict) else 1), data
+
+
+def partition_stats(days):
+    """عدد الجلسات والجلسات المفتوحة في بيانات شهر: {التاريخ: {كود الموظف: [[الحضور, الانصراف]]}}"""
+    sessions = 0
+    open_sessions = 0
+    for employees in days.values():
+        for records in employees.values():
+            sessions += len(records)
+            open_sessions += sum(1 for record in records if record[1] is None)
+    return {'sessions': sessions, 'open': open_sessions}
+
+
+def partition_employees(days):
+    """الموظفون الذين لهم جلسات في بيانات شهر (لفهرس أشهر الموظفين)"""
+    return {emp_id for employees in days.values() for emp_id, records in employees.items() if records}
+
+
+def is_archived(emp_data):
+    """هل الموظف مؤرشف (لا يسجل حضوراً جديداً لكن سجلاته محفوظة في التقارير)"""
+    return bool(emp_data.get('archived_on'))
+
+
+def with_hourly_rate(emp_data):
+    """بيانات الموظف مع سعر الساعة محسوباً من الراتب الشهري (للسجلات القديمة التي لا تحتويه)"""
+    if 'hourly_rate' in emp_data:
+        return emp_data
+    return dict(emp_data, hourly_rate=calculate_hourly_rate(emp_data.get('monthly_salary', 0)))
+
+
+def set_archived(emp_data, archived_on):
+    """نسخة من بيانات الموظف بتاريخ الأرشفة archived_on، أو بدونه ('') لموظف نشط"""
+    emp_data = dict(emp_data)
+    if archived_on:
+        emp_data['archived_on'] = archived_on
+    else:
+        emp_data.pop('archived_on', None)
+    return emp_data
+
+
+def day_rollup(sessions):
+    """ملخص يوم موظف من جلساته: [الساعات, أول حضور, آخر انصراف]، أو None إذا لم توجد ساعات"""
+    # الجمع بأجزاء المئة من الساعة حتى لا تتراكم أخطاء الكسور ويتطابق مع محرك الرواتب
+    total_hundredths = 0
+    last_check_out = None
+    sessions = sorted(sessions, key=attrgetter('check_in'))
+    for session in sessions:
+        if not session.is_open:
+            total_hundredths += to_hundredths(session.hours)
+            last_check_out = session.check_out
+    if total_hundredths <= 0:
+        return None
+    return [total_hundredths / 100, sessions[0].check_in, last_check_out]
+
+
+def month_rollup(day_hours, hourly_rate):
+    """ملخص شهر موظف من ساعات أيامه: [الأيام, الساعات, سعر الساعة, الراتب] بنفس قواعد تقرير الرواتب
+    
+    الإجماليات لا تُقرب هنا حتى يكون جمع عدة أشهر مثل جمع أيامها مباشرة.
+    """
+    return [len(day_hours), sum(day_hours), hourly_rate,
+            sum(calculate_salary(hourly_rate, hours) for hours in day_hours)]
+
+
+def next_month(month):
+    """الشهر التالي بصيغة YYYY-MM"""
+    year, number = int(month[:4]), int(month[5:])
+    return f'{year + number // 12:04d}-{number % 12 + 1:02d}'
+
+
+def month_end(month):
+    """آخر يوم في الشهر بصيغة YYYY-MM-DD"""
+    return (datetime.strptime(next_month(month) + '-01', '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def month_ranges(start_date, end_date):
+    """أجزاء الفترة في كل شهر: [(الشهر, أول يوم, آخر يوم, هل الشهر كامل)]"""
+    ranges = []
+    month = start_date[:7]
+    while month <= end_date[:7]:
+        last_day = month_end(month)
+        first = max(start_date, month + '-01')
+        last = min(end_date, last_day)
+        ranges.append((month, first, last, first == month + '-01' and last == last_day))
+        month = next_month(month)
+    return ranges
+
+
+class EmployeeDirectory:
+    """فهرس الموظفين للبحث ببداية الكود أو الاسم (أو أي كلمة فيه) مع تصفية القسم
+    
+    المفاتيح مرتبة فيكون البحث بالتنصيف، والنتائج بترتيب إضافة الموظفين. sync يحدّث الفهرس
+    من قاموس الموظفين ويعيد الموظفين الذين أضيفوا أو حُذفوا أو تغيرت بياناتهم فقط.
+    """
+    
+    def __init__(self, employees=None):
+        # {كود الموظف: نسخة من بياناته}
+        self.records = {}
+        # ترتيب الإضافة: {كود الموظف: رقم}
+        self.order = {}
+        self.next_order = 0
+        # [(مفتاح بحث بحروف صغيرة, كود الموظف)] مرتبة
+        self.keys = []
+        # {القسم: {أكواد الموظفين}}
+        self.departments = defaultdict(set)
+        if employees:
+            self.sync(employees)
+    
+    @staticmethod
+    def search_keys(emp_id, emp_data):
+        """مفاتيح البحث لموظف: الكود والاسم كاملاً وكل كلمة في الاسم"""
+        name = emp_data.get('name', '').lower()
+        return {emp_id.lower(), name} | set(name.split())
+    
+    def add(self, emp_id, emp_data):
+        """إضافة موظف إلى الفهرس (أو تحديث بياناته)"""
+        for key in self.register(emp_id, emp_data):
+            insort(self.keys, key)
+    
+    def register(self, emp_id, emp_data):
+        """حفظ بيانات الموظف وقسمه، وإرجاع مفاتيح البحث التي يجب إضافتها إلى self.keys"""
+        if emp_id in self.records:
+            self.remove(emp_id, keep_order=True)
+        else:
+            self.order[emp_id] = self.next_order
+            self.next_order += 1
+        self.records[emp_id] = dict(emp_data)
+        self.departments[emp_data.get('department', '')].add(emp_id)
+        return [(key, emp_id) for key in self.search_keys(emp_id, emp_data)]
+    
+    def remove(self, emp_id, keep_order=False):
+        """حذف موظف من الفهرس"""
+        emp_data = self.records.pop(emp_id, None)
+        if emp_data is None:
+            return
+        for key in self.search_keys(emp_id, emp_data):
+            i = bisect_left(self.keys, (key, emp_id))
+            if i < len(self.keys) and self.keys[i] == (key, emp_id):
+                del self.keys[i]
+        department = emp_data.get('department', '')
+        self.departments[department].discard(emp_id)
+        if not self.departments[department]:
+            del self.departments[department]
+        if not keep_order:
+            del self.order[emp_id]
+    
+    def sync(self, employees):
+        """تحديث الفهرس من قاموس الموظفين: (المضافون, المحذوفون, من تغيرت بياناتهم)"""
+        removed = [emp_id for emp_id in self.records if emp_id not in employees]
+        for emp_id in removed:
+            self.remove(emp_id)
+        added, changed = [], []
+        new_keys = []
+        for emp_id, emp_data in employees.items():
+            old = self.records.get(emp_id)
+            if old is None:
+                added.append(emp_id)
+            elif old != emp_data:
+                changed.append(emp_id)
+            else:
+                continue
+            new_keys.extend(self.register(emp_id, emp_data))
+        # عند التحميل الأول (أو تغيير كثير من الموظفين) الترتيب مرة واحدة أسرع من إدراج كل مفتاح
+        if len(new_keys) > 64:
+            self.keys.extend(new_keys)
+            self.keys.sort()
+        else:
+            for key in new_keys:
+                insort(self.keys, key)
+        return added, removed, changed
+    
+    def department_names(self):
+        """أسماء الأقسام المستخدمة مرتبة"""
+        return sorted(department for department in self.departments if department)
+    
+    def search(self, text='', department=''):
+        """أكواد الموظفين الذين يبدأ كودهم أو اسمهم أو كلمة من اسمهم بالنص، في القسم إن وُجد"""
+        prefix = text.strip().lower()
+        if prefix:
+            matches = set()
+            i = bisect_left(self.keys, (prefix,))
+            while i < len(self.keys) and self.keys[i][0].startswith(prefix):
+                matches.add(self.keys[i][1])
+                i += 1
+        else:
+            matches = self.records.keys()
+        if department:
+            matches = self.departments.get(department, set()) & matches
+        return sorted(matches, key=self.order.__getitem__)
+
+
+class JsonStorage:
+    """تخزين البيانات في ملفات JSON مقسمة بالشهر مع سجل إلحاقي للبصمات
+    
+    عند التشغيل يتم تحميل الشهر الحالي والأشهر التي بها جلسات مفتوحة فقط،
+    وباقي الأشهر تُحمّل عند أول تقرير يحتاجها.
+    
+    ملخصات الساعات لكل موظف في كل يوم وكل شهر تُحفظ في attendance/rollups/YYYY-MM.json
+    وتُحدّث مع كل بصمة، والتقارير تقرأها بدلاً من جلسات الأشهر.
+    
+    الفهرس يحفظ أيضاً أشهر كل موظف، فحذف موظف نهائياً يقرأ ويعيد كتابة أشهره فقط.
+    
+    أكثر من جهاز يمكنه استخدام نفس المجلد: كل كتابة تتم تحت قفل الملف وبعد تطبيق
+    ما أضافته الأجهزة الأخرى إلى السجل، وتعديلات الموظفين أحداث في السجل مثل البصمات.
+    """
+    
+    def __init__(self, data_dir='data', compact_every=500, commit_window_ms=0,
+                 report_cache_bytes=32 * 1024 * 1024):
+        self.data_dir = data_dir
+        self.employees_path = os.path.join(data_dir, 'employees.json')
+        self.partitions_dir = os.path.join(data_dir, 'attendance')
+        self.manifest_path = os.path.join(self.partitions_dir, 'manifest.json')
+        # سجل البصمات: يتم دمجه في ملفات البيانات كل عدد معين من الأحداث
+        self.journal = PunchJournal(os.path.join(data_dir, 'attendance.journal'),
+                                    commit_window=commit_window_ms / 1000)
+        # قفل بين الأجهزة التي تشترك في نفس المجلد
+        self.file_lock = FileLock(os.path.join(data_dir, 'data.lock'))
+        self.compact_every = compact_every
+        # ترميز ملفات الأشهر عند كتابتها (من الفهرس، ويتغير بأمر convert)
+        self.snapshot_encoding = 'json'
+        # يحمي البيانات من التعديل أثناء قراءتها من عمليات الخلفية
+        self.lock = threading.RLock()
+        self.employees = {}
+        # {الشهر YYYY-MM: {'sessions': عدد الجلسات, 'open': عدد الجلسات المفتوحة}}
+        self.partitions = {}
+        # الأشهر التي بها جلسات لكل موظف: {كود الموظف: {YYYY-MM}}، أو None لفهرس قديم لم يُبنَ بعد
+        self.employee_months = defaultdict(set)
+        self.loaded_months = set()
+        # الأشهر التي تغيرت بعد آخر حفظ ويجب إعادة كتابتها
+        self.dirty_months = set()
+        # {الشهر: {'employee_days': {كود الموظف: {التاريخ: ملخص اليوم}}, 'employees': {كود الموظف: ملخص الشهر}}}
+        self.rollups = {}
+        self.dirty_rollups = set()
+        # {التاريخ: {كود الموظف: [Session]}} للأشهر المحملة فقط
+        self.attendance = defaultdict(lambda: defaultdict(list))
+        # فهرس الجلسات المفتوحة: {كود الموظف: Session}
+        self.open_sessions = {}
+        # جلسات كل موظف مرتبة زمنياً: {كود الموظف: [Session]}
+        self.timelines = defaultdict(list)
+        self.report_cache = ReportCache(report_cache_bytes)
+    
+    @METRICS.timed('storage.load')
+    def load(self):
+        """تحميل بيانات الموظفين والأشهر التي يحتاجها التشغيل اليومي"""
+        with self.lock, self.file_lock:
+            version = json_storage_version(self.data_dir)
+            if version != STORAGE_FORMAT_VERSION:
+                raise StorageFormatError(
+                    f"صيغة ملفات الحضور {version} والبرنامج يقرأ الصيغة {STORAGE_FORMAT_VERSION}، يجب ترحيل البيانات أولاً")
+            
+            self.report_cache.clear()
+            # نفس القاموس يبقى مستخدماً في الواجهة فيتم تحديثه بدلاً من استبداله
+            self.employees.clear()
+            try:
+                self.employees.update((emp_id, with_hourly_rate(emp_data))
+                                      for emp_id, emp_data in read_snapshot(self.employees_path)[1].items())
+            except FileNotFoundError:
+                pass
+            
+            try:
+                manifest = read_snapshot(self.manifest_path)[1]
+            except FileNotFoundError:
+                manifest = {'partitions': {}}
+            self.partitions = manifest['partitions']
+            self.snapshot_encoding = manifest.get('encoding', 'json')
+            if 'employee_months' in manifest or not self.partitions:
+                self.employee_months = defaultdict(set, {
+                    emp_id: set(months) for emp_id, months in manifest.get('employee_months', {}).items()})
+            else:
+                self.employee_months = None
+            
+            self.loaded_months = set()
+            self.dirty_months = set()
+            self.rollups = {}
+            self.dirty_rollups = set()
+            self.attendance = defaultdict(lambda: defaultdict(list))
+            self.open_sessions = {}
+            self.timelines = defaultdict(list)
+            
+            current_month = datetime.now().strftime('%Y-%m')
+            for month, info in self.partitions.items():
+                if month == current_month or info.get('open'):
+                    self.load_partition(month)
+            
+            # إعادة تطبيق الأحداث المسجلة بعد آخر حفظ كامل
+            for event in self.journal.read():
+                self.apply_event(event)
+    
+    @METRICS.timed('storage.refresh')
+    def refresh(self, locked=True):
+        """تطبيق ما أضافته الأجهزة الأخرى إلى السجل منذ آخر قراءة
+        
+        locked=False للعرض فقط (مثل كتابة كود الموظف): قراءة ذيل السجل بدون قفل الملف حتى لا تنتظر
+        جهازاً آخر يدمج السجل، وإعادة التحميل بعد الدمج تُترك لأول كتابة (التي تأخذ القفل).
+        """
+        if not locked:
+            with self.lock:
+                for event in self.journal.read_new(repair=False) or ():
+                    self.apply_event(event)
+            return
+        
+        with self.lock, self.file_lock:
+            events = self.journal.read_new()
+            if events is None:
+                # جهاز آخر دمج السجل في ملفات البيانات: نعيد التحميل منها
+                self.journal.close()
+                self.load()
+                return
+            for event in events:
+                self.apply_event(event)
+    
+    def partition_path(self, month):
+        """مسار ملف شهر معين"""
+        return os.path.join(self.partitions_dir, f'{month}.json')
+    
+    def load_partition(self, month):
+        """تحميل ملف شهر إذا لم يكن محملاً"""
+        if month in self.loaded_months or month not in self.partitions:
+            return
+        
+        # القراءة خارج القفل حتى لا تنتظر البصمات قراءة ملف كبير
+        try:
+            version, days = read_snapshot(self.partition_path(month))
+        except FileNotFoundError:
+            version, days = STORAGE_FORMAT_VERSION, {}
+        
+        if version != STORAGE_FORMAT_VERSION:
+            raise StorageFormatError(f"ملف الشهر {month} ليس بالصيغة {STORAGE_FORMAT_VERSION}")
+        
+        with self.lock:
+            if month in self.loaded_months:
+                return
+            self.loaded_months.add(month)
+            
+            added = defaultdict(list)
+            for date, employees in days.items():
+                for emp_id, records in employees.items():
+                    sessions = self.attendance[date][emp_id]
+                    new_sessions = added[emp_id]
+                    for check_in, check_out in records:
+                        session = Session(emp_id, date, check_in, check_out)
+                        sessions.append(session)
+                        new_sessions.append(session)
+                        if check_out is None:
+                            self.open_sessions[emp_id] = session
+            
+            session_key = attrgetter('date', 'check_in')
+            for emp_id, new_sessions in added.items():
+                new_sessions.sort(key=session_key)
+                timeline = self.timelines[emp_id]
+                # جلسات الشهر تقع كلها بين جلسات الأشهر المحملة، فتُدرج في مكانها بدون إعادة ترتيب كل السجل
+                index = bisect_left(timeline, session_key(new_sessions[0]), key=session_key)
+                if index == len(timeline) or session_key(timeline[index]) > session_key(new_sessions[-1]):
+                    timeline[index:index] = new_sessions
+                else:
+                    timeline.extend(new_sessions)
+                    timeline.sort(key=session_key)
+    
+    def employee_index(self):
+        """أشهر كل موظف، مع بنائه من كل الأشهر مرة واحدة إذا كان الفهرس من نسخة أقدم"""
+        if self.employee_months is None:
+            self.load_all()
+            with self.lock:
+                employee_months = defaultdict(set)
+                for date, employees in self.attendance.items():
+                    for emp_id, sessions in employees.items():
+                        if sessions:
+                            employee_months[emp_id].add(date[:7])
+                self.employee_months = employee_months
+        return self.employee_months
+    
+    def load_months_between(self, start_date, end_date):
+        """تحميل كل الأشهر التي تقع في فترة"""
+        for month in sorted(self.partitions):
+            if start_date[:7] <= month <= end_date[:7]:
+                self.load_partition(month)
+    
+    def load_all(self):
+        """تحميل كل الأشهر (للنقل إلى SQLite أو العمليات على كل السجل)"""
+        for month in sorted(self.partitions):
+            self.load_partition(month)
+    
+    def rollup_path(self, month):
+        """مسار ملف ملخصات شهر"""
+        return os.path.join(self.partitions_dir, 'rollups', f'{month}.json')
+    
+    def load_rollup(self, month):
+        """ملخصات شهر: من ملفها إذا كانت مبنية على نفس ملف الشهر المحفوظ، وإلا تُبنى من الجلسات"""
+        rollup = self.rollups.get(month)
+        if rollup is not None:
+            return rollup
+        
+        try:
+            data = read_snapshot(self.rollup_path(month))[1]
+        except FileNotFoundError:
+            data = None
+        
+        with self.lock:
+            if month in self.rollups:
+                return self.rollups[month]
+            if (data is not None and data['partition'] == self.partitions.get(month)
+                    and 'employee_days' in data):
+                rollup = {'employee_days': data['employee_days'], 'employees': data['employees']}
+            else:
+                # ملف الملخصات غير موجود أو بالصيغة القديمة (الأيام أولاً) أو كُتب ملف الشهر بعده
+                rollup = self.build_rollup(month)
+                self.dirty_rollups.add(month)
+            self.rollups[month] = rollup
+            return rollup
+    
+    def build_rollup(self, month):
+        """حساب ملخصات شهر من جلساته"""
+        self.load_partition(month)
+        with self.lock:
+            employee_days = defaultdict(dict)
+            for date in sorted(self.attendance):
+                if date[:7] != month:
+                    continue
+                for emp_id, sessions in self.attendance[date].items():
+                    entry = day_rollup(sessions)
+                    if entry is not None:
+                        employee_days[emp_id][date] = entry
+            return {'employee_days': dict(employee_days), 'employees': {
+                emp_id: month_rollup([entry[0] for entry in days.values()], self.hourly_rate(emp_id))
+                for emp_id, days in employee_days.items()}}
+    
+    def hourly_rate(self, emp_id):
+        """سعر ساعة الموظف الحالي"""
+        return self.employees.get(emp_id, {}).get('hourly_rate', 0)
+    
+    def update_rollup(self, emp_id, date):
+        """إعادة حساب ملخص يوم الموظف وملخص شهره بعد تغير جلساته"""
+        month = date[:7]
+        rollup = self.load_rollup(month)
+        days = rollup['employee_days'].setdefault(emp_id, {})
+        entry = day_rollup(self.attendance[date].get(emp_id, ()))
+        if entry is not None:
+            days[date] = entry
+        else:
+            days.pop(date, None)
+        
+        if days:
+            rollup['employees'][emp_id] = month_rollup([days[day][0] for day in sorted(days)],
+                                                       self.hourly_rate(emp_id))
+        else:
+            del rollup['employee_days'][emp_id]
+            rollup['employees'].pop(emp_id, None)
+        self.dirty_rollups.add(month)
+    
+    def rollup_months(self, start_date, end_date):
+        """الأشهر التي بها جلسات في فترة (المحفوظة والجديدة)"""
+        return sorted(month for month in set(self.partitions) | set(self.rollups)
+                      if start_date[:7] <= month <= end_date[:7])
+    
+    def month_rollups(self, month):
+        """ملخص كل موظف في شهر: {كود الموظف: [الأيام, الساعات, سعر الساعة, الراتب]}"""
+        if month not in self.partitions and month not in self.rollups:
+            return {}
+        rollup = self.load_rollup(month)
+        with self.lock:
+            return dict(rollup['employees'])
+    
+    def day_rollups(self, start_date, end_date, emp_id=None):
+        """ملخصات الأيام في فترة مرتبة بالتاريخ: [(كود الموظف, التاريخ, الساعات, أول حضور, آخر انصراف)]"""
+        months = self.rollup_months(start_date, end_date)
+        if emp_id is not None and self.employee_months is not None:
+            # لا داعي لقراءة ملفات ملخصات الأشهر التي ليس للموظف جلسات فيها
+            months = [month for month in months if month in self.employee_months.get(emp_id, ())]
+        result = []
+        for month in months:
+            rollup = self.load_rollup(month)
+            with self.lock:
+                if emp_id is not None:
+                    # موظف واحد: أيامه فقط بدون المرور على باقي الموظفين
+                    employee_days = {emp_id: rollup['employee_days'].get(emp_id, {})}
+                else:
+                    employee_days = rollup['employee_days']
+                month_days = [(day_emp_id, date, hours, first_check_in, last_check_out)
+                              for day_emp_id, days in employee_days.items()
+                              for date, (hours, first_check_in, last_check_out) in days.items()
+                              if start_date <= date <= end_date]
+            month_days.sort(key=itemgetter(1))
+            result.extend(month_days)
+        return result
+    
+    def rebuild_rollups(self):
+        """إعادة بناء كل الملخصات من الجلسات وحفظها"""
+        with self.lock, self.file_lock:
+            self.refresh()
+            self.load_all()
+            self.rollups = {month: self.build_rollup(month) for month in self.partitions}
+            self.dirty_rollups = set(self.rollups)
+            self.save()
+            self.report_cache.clear()
+    
+    @METRICS.timed('storage.save')
+    def save(self):
+        """حفظ الموظفين والأشهر التي تغيرت ثم تفريغ سجل البصمات"""
+        with self.lock, self.file_lock:
+            # لا نكتب فوق أحداث الأجهزة الأخرى التي لم نطبقها بعد
+            self.refresh()
+            self.write_partitions()
+            # الملفات أصبحت تحتوي على كل الأحداث فلا حاجة للسجل
+            self.journal.reset()
+    
+    def write_partitions(self):
+        """كتابة ملف الموظفين وملفات الأشهر التي تغيرت فقط ثم الفهرس"""
+        with self.lock:
+            if not os.path.exists(self.partitions_dir):
+                os.makedirs(self.partitions_dir)
+            
+            write_snapshot(self.employees_path, self.employees)
+            
+            by_month = defaultdict(dict)
+            for date, employees in self.attendance.items():
+                if date[:7] in self.dirty_months:
+                    records = {emp_id: [session.to_record() for session in sessions]
+                               for emp_id, sessions in employees.items() if sessions}
+                    if records:
+                        by_month[date[:7]][date] = records
+            
+            for month in self.dirty_months:
+                month_data = by_month.get(month)
+                if not month_data:
+                    # لم يعد في الشهر أي جلسات (بعد حذف موظف)
+                    self.partitions.pop(month, None)
+                    if os.path.exists(self.partition_path(month)):
+                        os.remove(self.partition_path(month))
+                    continue
+                
+                write_snapshot(self.partition_path(month), month_data, self.snapshot_encoding)
+                self.partitions[month] = partition_stats(month_data)
+            
+            # كل ملف ملخصات يحمل إحصائيات ملف الشهر الذي بُني عليه، فإذا لم يطابقه يُعاد بناؤه
+            rollups_dir = os.path.join(self.partitions_dir, 'rollups')
+            if self.dirty_rollups and not os.path.exists(rollups_dir):
+                os.makedirs(rollups_dir)
+            for month in self.dirty_rollups:
+                if month not in self.partitions:
+                    self.rollups.pop(month, None)
+                    if os.path.exists(self.rollup_path(month)):
+                        os.remove(self.rollup_path(month))
+                    continue
+                rollup = self.rollups[month]
+                write_snapshot(self.rollup_path(month), {'partition': self.partitions[month],
+                                                         'employee_days': rollup['employee_days'],
+                                                         'employees': rollup['employees']})
+            self.dirty_rollups = set()
+            
+            # الفهرس آخراً: لا يشير أبداً إلى ملف شهر لم تكتمل كتابته
+            manifest = {'partitions': self.partitions, 'encoding': self.snapshot_encoding}
+            if self.employee_months is not None:
+                manifest['employee_months'] = {emp_id: sorted(months)
+                                               for emp_id, months in self.employee_months.items() if months}
+            write_snapshot(self.manifest_path, manifest)
+            self.dirty_months = set()
+    
+    def close(self):
+        """إغلاق سجل البصمات بعد كتابة ما تبقى منه"""
+        self.journal.close()
+    
+    def apply_event(self, event):
+        """تطبيق حدث من السجل: بصمة أو إضافة موظف أو أرشفته أو حذفه"""
+        if event['type'] == 'add_employee':
+            self.employees[event['emp_id']] = with_hourly_rate(event['data'])
+            self.invalidate_reports(event['emp_id'])
+        elif event['type'] == 'archive_employee':
+            if event['emp_id'] in self.employees:
+                self.employees[event['emp_id']] = set_archived(self.employees[event['emp_id']], event['archived_on'])
+                self.invalidate_reports(event['emp_id'])
+        elif event['type'] == 'remove_employee':
+            self.drop_employee(event['emp_id'])
+        else:
+            return self.apply_punch_event(event)
+    
+    def apply_punch_event(self, event):
+        """تطبيق حدث حضور أو انصراف على البيانات (التطبيق المتكرر لنفس الحدث لا يغير شيئاً)"""
+        month = event['date'][:7]
+        self.load_partition(month)
+        self.loaded_months.add(month)
+        self.dirty_months.add(month)
+        
+        emp_id = event['emp_id']
+        self.invalidate_reports(emp_id, event['date'])
+        if self.employee_months is not None:
+            self.employee_months[emp_id].add(month)
+        check_in = parse_timestamp(event['check_in'])
+        sessions = self.attendance[event['date']][emp_id]
+        for session in sessions:
+            if session.check_in == check_in:
+                break
+        else:
+            session = Session(emp_id, event['date'], check_in)
+            sessions.append(session)
+            insort(self.timelines[emp_id], session, key=attrgetter('date', 'check_in'))
+        
+        if event['type'] == 'check_out':
+            session.close(parse_timestamp(event['check_out']))
+        
+        if session.is_open:
+            self.open_sessions[emp_id] = session
+        elif self.open_sessions.get(emp_id) is session:
+            del self.open_sessions[emp_id]
+        self.update_rollup(emp_id, event['date'])
+        return session
+    
+    def invalidate_reports(self, emp_id, date=None):
+        """حذف نتائج التقارير المحفوظة التي تغطي الموظف في التاريخ (أو في كل التواريخ)"""
+        emp_data = self.employees.get(emp_id)
+        self.report_cache.invalidate(emp_id, date, emp_data.get('department', '') if emp_data else None)
+    
+    def check_punch(self, event):
+        """التأكد أن البصمة ما زالت صحيحة بعد تطبيق أحداث الأجهزة الأخرى"""
+        if event['emp_id'] not in self.employees:
+            raise StorageConflict("كود الموظف غير مسجل")
+        if event['type'] == 'check_in' and is_archived(self.employees[event['emp_id']]):
+            raise StorageConflict("الموظف مؤرشف ولا يمكن تسجيل حضوره")
+        
+        open_session = self.open_sessions.get(event['emp_id'])
+        if event['type'] == 'check_in' and open_session is not None:
+            raise StorageConflict(f"الموظف متحضر بالفعل من تاريخ {open_session.date}")
+        if event['type'] == 'check_out' and (
+                open_session is None or format_timestamp(open_session.check_in) != event['check_in']):
+            raise StorageConflict("تم تسجيل الانصراف لهذه الجلسة من جهاز آخر")
+    
+    def record_event(self, event):
+        """إضافة حدث إلى السجل وتطبيقه، وعند امتلاء السجل يتم دمجه في ملفات البيانات"""
+        self.journal.append(event)
+        result = self.apply_event(event)
+        if self.journal.entries >= self.compact_every:
+            self.save()
+        return result
+    
+    def record_punch(self, event):
+        """حفظ حدث حضور أو انصراف بإضافته إلى السجل بدلاً من إعادة كتابة كل الملفات"""
+        with self.lock, self.file_lock:
+            self.refresh()
+            self.check_punch(event)
+            result = self.record_event(event)
+        # البصمة لا تُعتبر مسجلة قبل تثبيتها على القرص، والانتظار بعد ترك الأقفال يجمعها مع غيرها في fsync واحد
+        self.journal.wait_synced()
+        return result
+    
+    @METRICS.timed('punch.record_batch')
+    def record_punches(self, events):
+        """تطبيق مجموعة أحداث (استيراد من ملف) ثم حفظ الأشهر المتأثرة مرة واحدة بدون السجل"""
+        with self.lock, self.file_lock:
+            self.refresh()
+            check_open_sessions(events, self.find_open_session)
+            for event in events:
+                self.apply_punch_event(event)
+            self.save()
+    
+    def add_employee(self, emp_id, emp_data):
+        """إضافة موظف"""
+        with self.lock, self.file_lock:
+            self.refresh()
+            if emp_id in self.employees:
+                raise StorageConflict("كود الموظف مسجل مسبقاً")
+            self.record_event({'type': 'add_employee', 'emp_id': emp_id, 'data': with_hourly_rate(emp_data)})
+        self.journal.wait_synced()
+    
+    def archive_employee(self, emp_id, archived=True):
+        """أرشفة موظف (إيقافه عن التسجيل مع الاحتفاظ بكل سجلاته) أو إعادة تفعيله"""
+        with self.lock, self.file_lock:
+            self.refresh()
+            if emp_id not in self.employees:
+                raise StorageConflict("كود الموظف غير مسجل")
+            archived_on = datetime.now().strftime('%Y-%m-%d') if archived else ''
+            self.record_event({'type': 'archive_employee', 'emp_id': emp_id, 'archived_on': archived_on})
+        self.journal.wait_synced()
+    
+    def remove_employee(self, emp_id):
+        """حذف موظف نهائياً مع كل سجلات حضوره"""
+        with self.lock, self.file_lock:
+            self.refresh()
+            if emp_id not in self.employees:
+                return
+            self.record_event({'type': 'remove_employee', 'emp_id': emp_id})
+            # الحذف يغير كل أشهر الموظف فيتم دمجه فوراً بدلاً من تكراره عند كل تشغيل
+            self.save()
+    
+    def drop_employee(self, emp_id):
+        """حذف موظف وكل جلساته من البيانات في الذاكرة (تُحمّل أشهره فقط من فهرس أشهر الموظفين)"""
+        self.invalidate_reports(emp_id)
+        self.employees.pop(emp_id, None)
+        self.open_sessions.pop(emp_id, None)
+        
+        months = self.employee_index().pop(emp_id, set())
+        for month in sorted(months):
+            self.load_partition(month)
+        for date in {session.date for session in self.timelines.pop(emp_id, ())}:
+            del self.attendance[date][emp_id]
+            if not self.attendance[date]:
+                del self.attendance[date]
+        
+        for month in months:
+            self.dirty_months.add(month)
+            rollup = self.load_rollup(month)
+            rollup['employees'].pop(emp_id, None)
+            rollup['employee_days'].pop(emp_id, None)
+            self.dirty_rollups.add(month)
+    
+    @METRICS.timed('punch.check_in')
+    def add_check_in(self, emp_id, date, check_in):
+        """تسجيل جلسة حضور جديدة"""
+        return self.record_punch({
+            'type': 'check_in',
+            'date': date,
+            'emp_id': emp_id,
+            'check_in': format_timestamp(check_in)
+        })
+    
+    @METRICS.timed('punch.check_out')
+    def close_session(self, session, check_out):
+        """تسجيل الانصراف لجلسة حضور مفتوحة"""
+        return self.record_punch({
+            'type': 'check_out',
+            'date': session.date,
+            'emp_id': session.emp_id,
+            'check_in': format_timestamp(session.check_in),
+            'check_out': format_timestamp(check_out)
+        })
+    
+    @METRICS.timed('index.find_open_session')
+    def find_open_session(self, emp_id):
+        """آخر جلسة حضور مفتوحة (بدون انصراف) للموظف أو None"""
+        with self.lock:
+            return self.open_sessions.get(emp_id)
+    
+    @METRICS.timed('index.sessions_on')
+    def sessions_on(self, date):
+        """جلسات الحضور في يوم معين: {كود الموظف: [Session]}"""
+        self.load_partition(date[:7])
+        with self.lock:
+            if date not in self.attendance:
+                return {}
+            # نسخة حتى لا تتأثر التقارير العاملة في الخلفية بالبصمات الجديدة
+            return {emp_id: list(sessions) for emp_id, sessions in self.attendance[date].items()}
+    
+    @METRICS.timed('index.sessions_between')
+    def sessions_between(self, emp_id, start_date, end_date):
+        """جلسات موظف في فترة مرتبة بالتاريخ: [(التاريخ, [Session])]"""
+        self.load_months_between(start_date, end_date)
+        with self.lock:
+            timeline = self.timelines.get(emp_id, [])
+            lo = bisect_left(timeline, start_date, key=attrgetter('date'))
+            hi = bisect_right(timeline, end_date, key=attrgetter('date'))
+            
+            result = []
+            for session in timeline[lo:hi]:
+                if not result or result[-1][0] != session.date:
+                    result.append((session.date, list(self.attendance[session.date][emp_id])))
+            return result
+    
+    @METRICS.timed('index.closed_sessions_between')
+    def closed_sessions_between(self, start_date, end_date):
+        """كل الجلسات المغلقة لكل الموظفين في فترة"""
+        self.load_months_between(start_date, end_date)
+        with self.lock:
+            return [session
+                    for date, employees in self.attendance.items() if start_date <= date <= end_date
+                    for sessions in employees.values()
+                    for session in sessions if not session.is_open]
+
+
+class SqliteStorage:
+    """تخزين البيانات في قاعدة SQLite مع فهارس على جدول الحضور"""
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS employees (
+            emp_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            department TEXT NOT NULL DEFAULT '',
+            monthly_salary REAL NOT NULL DEFAULT 0,
+            hourly_rate REAL NOT NULL DEFAULT 0,
+            archived_on TEXT NOT NULL DEFAULT ''
+        );
+        CREATE TABLE IF NOT EXISTS sessions (
+            id INTEGER PRIMARY KEY,
+            emp_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            check_in TEXT NOT NULL,
+            check_out TEXT NOT NULL DEFAULT ''
+        );
+        CREATE INDEX IF NOT EXISTS idx_sessions_emp_check_in ON sessions (emp_id, check_in);
+        CREATE INDEX IF NOT EXISTS idx_sessions_date ON sessions (date);
+        CREATE INDEX IF NOT EXISTS idx_sessions_open ON sessions (emp_id) WHERE check_out = '';
+        CREATE TABLE IF NOT EXISTS day_rollups (
+            emp_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            hours REAL NOT NULL,
+            first_check_in TEXT NOT NULL,
+            last_check_out TEXT NOT NULL,
+            PRIMARY KEY (emp_id, date)
+        );
+        CREATE INDEX IF NOT EXISTS idx_day_rollups_date ON day_rollups (date);
+        CREATE TABLE IF NOT EXISTS month_rollups (
+            emp_id TEXT NOT NULL,
+            month TEXT NOT NULL,
+            days INTEGER NOT NULL,
+            hours REAL NOT NULL,
+            hourly_rate REAL NOT NULL,
+            salary REAL NOT NULL,
+            PRIMARY KEY (emp_id, month)
+        );
+        CREATE INDEX IF NOT EXISTS idx_month_rollups_month ON month_rollups (month);
+    """
+    
+    def __init__(self, db_path, busy_timeout=30.0, report_cache_bytes=32 * 1024 * 1024):
+        self.db_path = db_path
+        # الاتصال مشترك بين الواجهة وعمليات الخلفية ومحمي بالقفل.
+        # المعاملات تبدأ صراحة بـ BEGIN IMMEDIATE، وأي جهاز آخر يكتب ينتظر حتى busy_timeout
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=busy_timeout,
+                                    isolation_level=None)
+        self.lock = threading.RLock()
+        self.conn.executescript(self.SCHEMA)
+        # قواعد أنشأتها نسخ أقدم بدون عمودي الأرشفة وسعر الساعة
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(employees)")}
+        if 'archived_on' not in columns:
+            self.conn.execute("ALTER TABLE employees ADD COLUMN archived_on TEXT NOT NULL DEFAULT ''")
+        if 'hourly_rate' not in columns:
+            with self.transaction():
+                self.conn.execute("ALTER TABLE employees ADD COLUMN hourly_rate REAL NOT NULL DEFAULT 0")
+                self.conn.executemany(
+                    "UPDATE employees SET hourly_rate = ? WHERE emp_id = ?",
+                    [(calculate_hourly_rate(monthly_salary), emp_id) for emp_id, monthly_salary in
+                     self.conn.execute("SELECT emp_id, monthly_salary FROM employees").fetchall()])
+        self.employees = {}
+        self.report_cache = ReportCache(report_cache_bytes)
+        # يتغير عندما يكتب جهاز آخر في القاعدة
+        self.data_version = None
+        # قواعد أنشأتها نسخ أقدم لا تحتوي ملخصات، فتُبنى مرة واحدة عند أول تحميل
+        self.rollups_checked = False
+    
+    @contextmanager
+    def transaction(self):
+        """معاملة كتابة تحجز القاعدة من بدايتها حتى لا يتداخل معها جهاز آخر بين القراءة والكتابة"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+    
+    @METRICS.timed('storage.load')
+    def load(self):
+        """تحميل بيانات الموظفين (سجلات الحضور تبقى في القاعدة وتُقرأ عند الحاجة)"""
+        with self.lock:
+            self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            # قاموس جديد يحل محل القديم، فلا يتغير قاموس تقرأه الواجهة أو عملية أخرى أثناء التحميل
+            self.employees = {
+                emp_id: set_archived({'name': name, 'department': department, 'monthly_salary': monthly_salary,
+                                      'hourly_rate': hourly_rate}, archived_on)
+                for emp_id, name, department, monthly_salary, hourly_rate, archived_on in self.conn.execute(
+                    "SELECT emp_id, name, department, monthly_salary, hourly_rate, archived_on "
+                    "FROM employees ORDER BY rowid")}
+            
+            if not self.rollups_checked:
+                self.rollups_checked = True
+                if (self.conn.execute("SELECT 1 FROM day_rollups LIMIT 1").fetchone() is None
+                        and self.conn.execute("SELECT 1 FROM sessions WHERE check_out != '' LIMIT 1").fetchone()):
+                    self.rebuild_rollups()
+    
+    @METRICS.timed('storage.refresh')
+    def refresh(self, locked=True):
+        """قراءة الموظفين إذا كتب جهاز آخر في القاعدة منذ آخر تحميل (الجلسات تُقرأ من القاعدة دائماً)
+        
+        لا نعرف ما غيّره الجهاز الآخر، فتُحذف كل نتائج التقارير المحفوظة. القراءة لا تحتاج قفلاً
+        بين الأجهزة فالمعامل locked لتوافق الواجهة مع JsonStorage فقط.
+        """
+        with self.lock:
+            if self.conn.execute("PRAGMA data_version").fetchone()[0] != self.data_version:
+                self.report_cache.clear()
+                self.load()
+    
+    @METRICS.timed('storage.save')
+    def save(self):
+        """كل عملية تُحفظ فور تنفيذها فلا يوجد ما يُحفظ هنا"""
+    
+    def close(self):
+        """إغلاق الاتصال بالقاعدة"""
+        self.conn.close()
+    
+    def add_employee(self, emp_id, emp_data):
+        """إضافة موظف"""
+        emp_data = with_hourly_rate(emp_data)
+        with self.transaction():
+            if self.conn.execute("SELECT 1 FROM employees WHERE emp_id = ?", (emp_id,)).fetchone():
+                raise StorageConflict("كود الموظف مسجل مسبقاً")
+            self.conn.execute(
+                "INSERT INTO employees (emp_id, name, department, monthly_salary, hourly_rate, archived_on) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (emp_id, emp_data['name'], emp_data.get('department', ''), emp_data.get('monthly_salary', 0),
+                 emp_data['hourly_rate'], emp_data.get('archived_on', '')))
+            self.employees[emp_id] = emp_data
+            self.invalidate_reports(emp_id)
+    
+    def archive_employee(self, emp_id, archived=True):
+        """أرشفة موظف (إيقافه عن التسجيل مع الاحتفاظ بكل سجلاته) أو إعادة تفعيله"""
+        archived_on = datetime.now().strftime('%Y-%m-%d') if archived else ''
+        with self.transaction():
+            if not self.conn.execute("UPDATE employees SET archived_on = ? WHERE emp_id = ?",
+                                     (archived_on, emp_id)).rowcount:
+                raise StorageConflict("كود الموظف غير مسجل")
+            if emp_id in self.employees:
+                self.employees[emp_id] = set_archived(self.employees[emp_id], archived_on)
+            self.invalidate_reports(emp_id)
+    
+    def remove_employee(self, emp_id):
+        """حذف موظف نهائياً مع كل سجلات حضوره (كل الحذف يستخدم فهارس كود الموظف)"""
+        with self.transaction():
+            self.conn.execute("DELETE FROM sessions WHERE emp_id = ?", (emp_id,))
+            self.conn.execute("DELETE FROM day_rollups WHERE emp_id = ?", (emp_id,))
+            self.conn.execute("DELETE FROM month_rollups WHERE emp_id = ?", (emp_id,))
+            self.conn.execute("DELETE FROM employees WHERE emp_id = ?", (emp_id,))
+            self.invalidate_reports(emp_id)
+            self.employees.pop(emp_id, None)
+    
+    def invalidate_reports(self, emp_id, date=None):
+        """حذف نتائج التقارير المحفوظة التي تغطي الموظف في التاريخ (أو في كل التواريخ)"""
+        emp_data = self.employees.get(emp_id)
+        self.report_cache.invalidate(emp_id, date, emp_data.get('department', '') if emp_data else None)
+    
+    @METRICS.timed('punch.check_in')
+    def add_check_in(self, emp_id, date, check_in):
+        """تسجيل جلسة حضور جديدة"""
+        with self.transaction():
+            row = self.conn.execute("SELECT archived_on FROM employees WHERE emp_id = ?", (emp_id,)).fetchone()
+            if row is not None and row[0]:
+                raise StorageConflict("الموظف مؤرشف ولا يمكن تسجيل حضوره")
+            open_session = self.find_open_session(emp_id)
+            if open_session is not None:
+                raise StorageConflict(f"الموظف متحضر بالفعل من تاريخ {open_session.date}")
+            self.conn.execute(
+                "INSERT INTO sessions (emp_id, date, check_in) VALUES (?, ?, ?)",
+                (emp_id, date, format_timestamp(check_in)))
+            self.invalidate_reports(emp_id, date)
+            return Session(emp_id, date, check_in)
+    
+    @METRICS.timed('punch.check_out')
+    def close_session(self, session, check_out):
+        """تسجيل الانصراف لجلسة حضور مفتوحة"""
+        with self.transaction():
+            updated = self.conn.execute(
+                "UPDATE sessions SET check_out = ? WHERE emp_id = ? AND check_in = ? AND check_out = ''",
+                (format_timestamp(check_out), session.emp_id, format_timestamp(session.check_in))).rowcount
+            if not updated:
+                raise StorageConflict("تم تسجيل الانصراف لهذه الجلسة من جهاز آخر")
+            self.invalidate_reports(session.emp_id, session.date)
+            self.update_rollup(session.emp_id, session.date)
+            session.close(check_out)
+            return session
+    
+    @METRICS.timed('punch.record_batch')
+    def record_punches(self, events):
+        """تسجيل مجموعة أحداث (استيراد من ملف) في معاملة واحدة"""
+        with self.transaction():
+            check_open_sessions(events, self.find_open_session)
+            changed_days = set()
+            for event in events:
+                self.invalidate_reports(event['emp_id'], event['date'])
+                changed_days.add((event['emp_id'], event['date']))
+                if event['type'] == 'check_out':
+                    updated = self.conn.execute(
+                        "UPDATE sessions SET check_out = ? WHERE emp_id = ? AND check_in = ? AND check_out = ''",
+                        (event['check_out'], event['emp_id'], event['check_in'])).rowcount
+                    if updated:
+                        continue
+                self.conn.execute(
+                    "INSERT INTO sessions (emp_id, date, check_in, check_out) VALUES (?, ?, ?, ?)",
+                    (event['emp_id'], event['date'], event['check_in'], event.get('check_out', '')))
+            for emp_id, date in sorted(changed_days):
+                self.update_rollup(emp_id, date)
+    
+    def hourly_rate(self, emp_id):
+        """سعر ساعة الموظف الحالي"""
+        return self.employees.get(emp_id, {}).get('hourly_rate', 0)
+    
+    def update_rollup(self, emp_id, date):
+        """إعادة حساب ملخص يوم الموظف وملخص شهره داخل معاملة الكتابة"""
+        sessions = [Session(emp_id, date, parse_timestamp(check_in), parse_timestamp(check_out))
+                    for check_in, check_out in self.conn.execute(
+                        "SELECT check_in, check_out FROM sessions WHERE emp_id = ? AND date = ?", (emp_id, date))]
+        entry = day_rollup(sessions)
+        if entry is None:
+            self.conn.execute("DELETE FROM day_rollups WHERE emp_id = ? AND date = ?", (emp_id, date))
+        else:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO day_rollups (emp_id, date, hours, first_check_in, last_check_out) "
+                "VALUES (?, ?, ?, ?, ?)", (emp_id, date, entry[0], format_timestamp(entry[1]),
+                                           format_timestamp(entry[2])))
+        
+        month = date[:7]
+        day_hours = [hours for hours, in self.conn.execute(
+            "SELECT hours FROM day_rollups WHERE emp_id = ? AND date BETWEEN ? AND ? ORDER BY date",
+            (emp_id, month + '-01', month + '-31'))]
+        if day_hours:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO month_rollups (emp_id, month, days, hours, hourly_rate, salary) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (emp_id, month, *month_rollup(day_hours, self.hourly_rate(emp_id))))
+        else:
+            self.conn.execute("DELETE FROM month_rollups WHERE emp_id = ? AND month = ?", (emp_id, month))
+    
+    def rebuild_rollups(self):
+        """إعادة بناء كل الملخصات من الجلسات في معاملة واحدة"""
+        with self.transaction():
+            self.conn.execute("DELETE FROM day_rollups")
+            self.conn.execute("DELETE FROM month_rollups")
+            rows = self.conn.execute(
+                "SELECT emp_id, date, check_in, check_out FROM sessions ORDER BY emp_id, date, check_in").fetchall()
+            days = []
+            for (emp_id, date), group in groupby(rows, key=itemgetter(0, 1)):
+                entry = day_rollup([Session(emp_id, date, parse_timestamp(check_in), parse_timestamp(check_out))
+                                    for _, _, check_in, check_out in group])
+                if entry is not None:
+                    days.append((emp_id, date, entry[0], format_timestamp(entry[1]), format_timestamp(entry[2])))
+            self.conn.executemany(
+                "INSERT INTO day_rollups (emp_id, date, hours, first_check_in, last_check_out) "
+                "VALUES (?, ?, ?, ?, ?)", days)
+            self.conn.executemany(
+                "INSERT INTO month_rollups (emp_id, month, days, hours, hourly_rate, salary) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(emp_id, month, *month_rollup([day[2] for day in group], self.hourly_rate(emp_id)))
+                 for (emp_id, month), group in groupby(days, key=lambda day: (day[0], day[1][:7]))])
+            self.report_cache.clear()
+    
+    def month_rollups(self, month):
+        """ملخص كل موظف في شهر: {كود الموظف: [الأيام, الساعات, سعر الساعة, الراتب]}"""
+        with self.lock:
+            return {emp_id: [days, hours, hourly_rate, salary]
+                    for emp_id, days, hours, hourly_rate, salary in self.conn.execute(
+                        "SELECT emp_id, days, hours, hourly_rate, salary FROM month_rollups WHERE month = ?",
+                        (month,))}
+    
+    def day_rollups(self, start_date, end_date, emp_id=None):
+        """ملخصات الأيام في فترة مرتبة بالتاريخ: [(كود الموظف, التاريخ, الساعات, أول حضور, آخر انصراف)]"""
+        query = "SELECT emp_id, date, hours, first_check_in, last_check_out FROM day_rollups WHERE date BETWEEN ? AND ?"
+        params = [start_date, end_date]
+        if emp_id is not None:
+            query += " AND emp_id = ?"
+            params.append(emp_id)
+        with self.lock:
+            rows = self.conn.execute(query + " ORDER BY date", params).fetchall()
+        return [(row_emp_id, date, hours, parse_timestamp(first_check_in), parse_timestamp(last_check_out))
+                for row_emp_id, date, hours, first_check_in, last_check_out in rows]
+    
+    @METRICS.timed('index.find_open_session')
+    def find_open_session(self, emp_id):
+        """آخر جلسة حضور مفتوحة (بدون انصراف) للموظف أو None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT date, check_in FROM sessions INDEXED BY idx_sessions_open "
+                "WHERE emp_id = ? AND check_out = '' ORDER BY check_in DESC LIMIT 1", (emp_id,)).fetchone()
+            if row is None:
+                return None
+            return Session(emp_id, row[0], parse_timestamp(row[1]))
+    
+    @METRICS.timed('index.sessions_on')
+    def sessions_on(self, date):
+        """جلسات الحضور في يوم معين: {كود الموظف: [Session]}"""
+        with self.lock:
+            result = {}
+            for emp_id, check_in, check_out in self.conn.execute(
+                    "SELECT emp_id, check_in, check_out FROM sessions WHERE date = ? ORDER BY id", (date,)):
+                result.setdefault(emp_id, []).append(
+                    Session(emp_id, date, parse_timestamp(check_in), parse_timestamp(check_out)))
+            return result
+    
+    @METRICS.timed('index.sessions_between')
+    def sessions_between(self, emp_id, start_date, end_date):
+        """جلسات موظف في فترة مرتبة بالتاريخ: [(التاريخ, [Session])]"""
+        with self.lock:
+            result = []
+            for date, check_in, check_out in self.conn.execute(
+                    "SELECT date, check_in, check_out FROM sessions "
+                    "WHERE emp_id = ? AND check_in BETWEEN ? AND ? ORDER BY check_in",
+                    (emp_id, start_date + ' 00:00:00', end_date + ' 23:59:59')):
+                if not result or result[-1][0] != date:
+                    result.append((date, []))
+                result[-1][1].append(Session(emp_id, date, parse_timestamp(check_in), parse_timestamp(check_out)))
+            return result
+    
+    @METRICS.timed('index.closed_sessions_between')
+    def closed_sessions_between(self, start_date, end_date):
+        """كل الجلسات المغلقة لكل الموظفين في فترة"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT emp_id, date, check_in, check_out FROM sessions "
+                "WHERE date BETWEEN ? AND ? AND check_out != ''", (start_date, end_date)).fetchall()
+        return [Session(emp_id, date, parse_timestamp(check_in), parse_timestamp(check_out))
+                for emp_id, date, check_in, check_out in rows]
+
+
+def build_session_table(sessions):
+    """بناء جدول أعمدة للجلسات المغلقة: الموظف، التاريخ، البداية، النهاية، المدة بالساعات وبأجزاء المئة"""
+    # numpy و pandas بطيئان في التحميل فلا يتم استيرادهما إلا عند أول حساب رواتب
+    import numpy as np
+    import pandas as pd
+    
+    emp_ids, dates, starts, ends = [], [], [], []
+    for session in sessions:
+        emp_ids.append(session.emp_id)
+        dates.append(session.date)
+        starts.append(session.check_in)
+        ends.append(session.check_out)
+    
+    start = np.array(starts, dtype=np.int64)
+    end = np.array(ends, dtype=np.int64)
+    # np.round يقرب أنصاف المئات بشكل مختلف عن round، فكل مدة مختلفة تُحسب بدالة الجلسات نفسها
+    durations, positions = np.unique(end - start, return_inverse=True)
+    hundredths = np.array([to_hundredths(session_hours(int(seconds))) for seconds in durations], dtype=np.int64)
+    hundredths = hundredths[positions.reshape(-1)]
+    return pd.DataFrame({
+        'emp_id': pd.Series(emp_ids, dtype='object'),
+        'date': pd.Series(dates, dtype='object'),
+        'start': start,
+        'end': end,
+        'hours': hundredths / 100,
+        'hundredths': hundredths
+    })
+
+
+def compute_payroll(table, hourly_rates):
+    """حساب الساعات والرواتب لكل موظف ولكل يوم بعمليات تجميع على الأعمدة
+    
+    يعيد (إجمالي كل موظف, إجمالي كل يوم لكل موظف) بنفس قواعد التقرير الشهري:
+    راتب اليوم = سعر الساعة × ساعات اليوم مقرباً لمنزلتين، والأيام بدون ساعات لا تُحسب.
+    الجمع بأعداد صحيحة (أجزاء المئة من الساعة والقروش) فيتطابق مع ملخصات الأيام والأشهر تماماً.
+    """
+    daily = table.groupby(['emp_id', 'date'], sort=True, as_index=False)['hundredths'].sum()
+    daily = daily[daily['hundredths'] > 0].copy()
+    daily['hourly_rate'] = daily['emp_id'].map(hourly_rates).fillna(0).astype(float)
+    daily['salary_cents'] = salary_cents((daily['hourly_rate'] * 100).round().astype('int64'), daily['hundredths'])
+    
+    per_employee = daily.groupby('emp_id', sort=True).agg(
+        days=('date', 'size'),
+        hundredths=('hundredths', 'sum'),
+        salary_cents=('salary_cents', 'sum'))
+    per_employee['hours'] = per_employee.pop('hundredths') / 100
+    per_employee['salary'] = per_employee.pop('salary_cents') / 100
+    daily['hours'] = daily.pop('hundredths') / 100
+    daily['salary'] = daily.pop('salary_cents') / 100
+    return per_employee, daily.reset_index(drop=True)
+
+
+def json_storage_version(data_dir):
+    """رقم صيغة ملفات الحضور الموجودة في مجلد البيانات"""
+    if os.path.exists(os.path.join(data_dir, 'attendance.json')):
+        return 0
+    try:
+        return read_snapshot(os.path.join(data_dir, 'attendance', 'manifest.json'))[0]
+    except FileNotFoundError:
+        # مجلد جديد بدون بيانات حضور
+        return STORAGE_FORMAT_VERSION
+
+
+def convert_legacy_days(days):
+    """تحويل أيام بصيغة 0 أو 1 ({التاريخ: {كود الموظف: سجل أو [سجلات]}} بأوقات نصية) إلى الصيغة الحالية"""
+    converted = {}
+    for date, employees in days.items():
+        for emp_id, records in employees.items():
+            if isinstance(records, dict):
+                records = [records]
+            elif not isinstance(records, list):
+                continue
+            
+            for record in records:
+                check_in = parse_timestamp(record.get('check_in'))
+                if check_in is not None:
+                    converted.setdefault(date, {}).setdefault(emp_id, []).append(
+                        [check_in, parse_timestamp(record.get('check_out'))])
+    return converted
+
+
+def migrate_json_storage(data_dir):
+    """ترحيل ملفات الحضور إلى الصيغة الحالية مرة واحدة، ويمكن إعادة تشغيله إذا توقف
+    
+    كل شهر يُكتب بالصيغة الجديدة في ملفه ويحمل رقم الصيغة، فالأشهر المرحّلة قبل
+    التوقف يتم تخطيها. الفهرس يُكتب في النهاية فقط، وبعده لا يُعاد الترحيل.
+    الملفات التالفة توقف الترحيل بخطأ ولا يتم تجاهلها.
+    """
+    version = json_storage_version(data_dir)
+    if version > STORAGE_FORMAT_VERSION:
+        raise StorageFormatError(f"صيغة ملفات الحضور {version} أحدث من هذا البرنامج")
+    if version == STORAGE_FORMAT_VERSION:
+        index_employee_months(data_dir)
+        return
+    
+    partitions_dir = os.path.join(data_dir, 'attendance')
+    if not os.path.exists(partitions_dir):
+        os.makedirs(partitions_dir)
+    legacy_path = os.path.join(data_dir, 'attendance.json')
+    
+    if version == 0:
+        # الصيغة 0: كل التواريخ في ملف واحد
+        old_data = read_snapshot(legacy_path)[1]
+        months = defaultdict(dict)
+        for date, employees in old_data.items():
+            months[date[:7]][date] = employees
+    else:
+        # الصيغ 1 و2: ملف لكل شهر
+        months = {name[:-len('.json')]: None for name in os.listdir(partitions_dir)
+                  if name.endswith('.json') and name != 'manifest.json'}
+    
+    partitions = {}
+    # فهرس أشهر الموظفين يُبنى أثناء المرور على الأيام حتى لا يحتاج الحذف تحميل كل السجل لاحقاً
+    employee_months = defaultdict(list)
+    for month in sorted(months):
+        path = os.path.join(partitions_dir, f'{month}.json')
+        file_version, data = read_snapshot(path) if os.path.exists(path) else (None, None)
+        
+        if file_version == STORAGE_FORMAT_VERSION:
+            # شهر تم ترحيله قبل توقف الترحيل السابق
+            days = data
+        else:
+            if version == 0:
+                days = convert_legacy_days(months[month])
+            elif file_version == 1:
+                days = convert_legacy_days(data)
+            else:
+                # الصيغة 2: نفس المحتوى بدون سطر الرأس
+                days = data['days']
+            if not days:
+                continue
+            write_snapshot(path, days)
+        partitions[month] = partition_stats(days)
+        for emp_id in partition_employees(days):
+            employee_months[emp_id].append(month)
+    
+    employees_path = os.path.join(data_dir, 'employees.json')
+    if os.path.exists(employees_path):
+        employees_version, employees = read_snapshot(employees_path)
+        if employees_version != STORAGE_FORMAT_VERSION:
+            write_snapshot(employees_path, employees)
+    
+    write_snapshot(os.path.join(partitions_dir, 'manifest.json'),
+                   {'partitions': partitions, 'employee_months': dict(employee_months)})
+    if version == 0:
+        os.replace(legacy_path, legacy_path + '.bak')
+
+
+def index_employee_months(data_dir):
+    """إضافة فهرس أشهر الموظفين لفهرس كُتب بدونه (ترحيل سابق) بقراءة ملفات الأشهر مرة واحدة"""
+    manifest_path = os.path.join(data_dir, 'attendance', 'manifest.json')
+    try:
+        if 'employee_months' in read_snapshot(manifest_path)[1]:
+            return
+    except FileNotFoundError:
+        return
+    
+    with FileLock(os.path.join(data_dir, 'data.lock')):
+        # جهاز آخر قد يكون أضاف الفهرس أو غيّر الأشهر قبل أخذ القفل
+        manifest = read_snapshot(manifest_path)[1]
+        if 'employee_months' in manifest:
+            return
+        employee_months = defaultdict(list)
+        for month in sorted(manifest['partitions']):
+            try:
+                days = read_snapshot(os.path.join(data_dir, 'attendance', f'{month}.json'))[1]
+            except FileNotFoundError:
+                continue
+            for emp_id in partition_employees(days):
+                employee_months[emp_id].append(month)
+        manifest['employee_months'] = dict(employee_months)
+        write_snapshot(manifest_path, manifest)
+
+
+def convert_json_storage(data_dir, encoding):
+    """إعادة كتابة كل ملفات الأشهر بترميز آخر ('json' أو 'binary') وحفظه في الفهرس لتستخدمه كل الأجهزة"""
+    if encoding not in SNAPSHOT_ENCODINGS:
+        raise ValueError(f"ترميز غير معروف: {encoding}")
+    
+    storage = JsonStorage(data_dir)
+    storage.load()
+    try:
+        with storage.lock, storage.file_lock:
+            storage.refresh()
+            storage.load_all()
+            # كل الأشهر محملة فيُبنى فهرس أشهر الموظفين للملفات القديمة بدون تكلفة إضافية
+            storage.employee_index()
+            storage.snapshot_encoding = encoding
+            storage.dirty_months.update(storage.partitions)
+            storage.save()
+    finally:
+        storage.close()
+
+
+def migrate_json_to_sqlite(data_dir, db_path):
+    """نقل البيانات من ملفات JSON إلى قاعدة SQLite مرة واحدة"""
+    migrate_json_storage(data_dir)
+    source = JsonStorage(data_dir)
+    source.load()
+    source.load_all()
+    source.close()
+    
+    # البناء في ملف مؤقت ثم إعادة التسمية حتى لا تبقى قاعدة نصف منقولة
+    tmp_path = db_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    
+    target = SqliteStorage(tmp_path)
+    with target.transaction():
+        target.conn.executemany(
+            "INSERT INTO employees (emp_id, name, department, monthly_salary, hourly_rate, archived_on) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(emp_id, emp_data['name'], emp_data.get('department', ''), emp_data.get('monthly_salary', 0),
+              emp_data['hourly_rate'], emp_data.get('archived_on', ''))
+             for emp_id, emp_data in source.employees.items()])
+        target.conn.executemany(
+            "INSERT INTO sessions (emp_id, date, check_in, check_out) VALUES (?, ?, ?, ?)",
+            [(emp_id, date, format_timestamp(session.check_in), format_timestamp(session.check_out))
+             for date in sorted(source.attendance.keys())
+             for emp_id, sessions in source.attendance[date].items()
+             for session in sessions])
+    # التحميل الأول يبني جداول الملخصات من الجلسات المنقولة
+    target.load()
+    target.close()
+    os.replace(tmp_path, db_path)
+
+
+# أنواع التخزين المتاحة في open_storage (خيار --backend في سطر الأوامر و ATTENDANCE_BACKEND في الواجهة)
+STORAGE_BACKENDS = ('json', 'sqlite')
+
+
+def open_storage(backend='json', data_dir='data', commit_window_ms=0):
+    """فتح طبقة التخزين المطلوبة ('json' أو 'sqlite') وتحميل بياناتها
+    
+    commit_window_ms لتخزين JSON فقط: مدة إضافية لتجميع البصمات في fsync واحد قبل تأكيدها (SQLite يثبّت كل معاملة).
+    """
+    if not os.path.exists(data_dir):
+        os.makedirs(data_dir)
+    
+    if backend == 'sqlite':
+        db_path = os.path.join(data_dir, 'attendance.db')
+        if not os.path.exists(db_path):
+            migrate_json_to_sqlite(data_dir, db_path)
+        storage = SqliteStorage(db_path)
+    elif backend == 'json':
+        # ترحيل الصيغ القديمة يحدث مرة واحدة فقط، وبعدها لا يفعل شيئاً
+        migrate_json_storage(data_dir)
+        storage = JsonStorage(data_dir, commit_window_ms=commit_window_ms)
+    else:
+        raise ValueError(f"نوع تخزين غير معروف: {backend}")
+    
+    storage.load()
+    return storage
+
+
+# أسماء الأعمدة المقبولة في ملفات CSV للبصمات
+PUNCH_CSV_COLUMNS = {
+    'emp_id': ('emp_id', 'id', 'user_id', 'كود الموظف'),
+    'time': ('time', 'timestamp', 'datetime', 'punch_time', 'الوقت'),
+    'direction': ('direction', 'type', 'state', 'status', 'النوع'),
+}
+# قيم نوع البصمة: أجهزة البصمة تستخدم 0 للحضور و1 للانصراف
+PUNCH_DIRECTIONS = {
+    '0': 'in', 'in': 'in', 'i': 'in', 'check_in': 'in', 'حضور': 'in',
+    '1': 'out', 'out': 'out', 'o': 'out', 'check_out': 'out', 'انصراف': 'out',
+}
+# سطر من سجل جهاز البصمة: الكود ثم التاريخ والوقت ثم (اختيارياً) طريقة التحقق ونوع البصمة
+PUNCH_LOG_LINE = re.compile(
+    r'^\s*(\S+)\s+(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2})?)(?:\s+(\S+))?(?:\s+(\S+))?')
+# بصمتان لنفس الموظف خلال هذه المدة (بالثواني) تعتبران بصمة مكررة من الجهاز
+DUPLICATE_PUNCH_SECONDS = 60
+
+
+def read_punch_file(path):
+    """قراءة ملف بصمات سطراً بسطر: (رقم السطر, النص, كود الموظف, الوقت بالثواني أو None, 'in'/'out'/None)
+    
+    ملفات .csv يجب أن يكون لها سطر عناوين، وباقي الملفات تُقرأ كسجل جهاز بصمة.
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if path.lower().endswith('.csv'):
+            reader = csv.reader(f)
+            header = [name.strip().lower() for name in next(reader, [])]
+            columns = {}
+            for key, names in PUNCH_CSV_COLUMNS.items():
+                for name in names:
+                    if name in header:
+                        columns[key] = header.index(name)
+                        break
+            if 'emp_id' not in columns or 'time' not in columns:
+                raise ValueError("ملف CSV يجب أن يحتوي على عمودي كود الموظف والوقت")
+            
+            for line_no, row in enumerate(reader, 2):
+                if not any(cell.strip() for cell in row):
+                    continue
+                text = ','.join(row)
+                if len(row) <= max(columns.values()):
+                    yield line_no, text, None, None, None
+                    continue
+                direction = None
+                if 'direction' in columns:
+                    direction = PUNCH_DIRECTIONS.get(row[columns['direction']].strip().lower(), '?')
+                yield (line_no, text, row[columns['emp_id']].strip(),
+                       parse_timestamp(row[columns['time']].strip()), direction)
+        else:
+            for line_no, line in enumerate(f, 1):
+                text = line.strip()
+                if not text:
+                    continue
+                match = PUNCH_LOG_LINE.match(text)
+                if match is None:
+                    yield line_no, text, None, None, None
+                    continue
+                emp_id, moment, _, state = match.groups()
+                direction = PUNCH_DIRECTIONS.get(state.lower(), '?') if state is not None else None
+                yield line_no, text, emp_id, parse_timestamp(moment.replace('T', ' ')), direction
+
+
+def pair_punches(storage, punches, cancel_event=None):
+    """تحويل بصمات الملف إلى أحداث حضور وانصراف بعد التحقق منها: (الأحداث, [(رقم السطر, النص, السبب)])
+    
+    بصمات كل موظف تُرتب زمنياً، وإذا لم يحدد الملف نوع البصمة تُعتبر بالتناوب حضوراً ثم انصرافاً.
+    أول انصراف بعد جلسة مفتوحة مسجلة مسبقاً يغلقها، وأي حضور قبل ذلك يُرفض حتى لا يكون للموظف
+    جلستان مفتوحتان. الجلسات المسجلة مسبقاً لا تتكرر.
+    """
+    rejected = []
+    by_employee = defaultdict(list)
+    storage.refresh()
+    with storage.lock:
+        # {كود الموظف: تاريخ الأرشفة أو ''}
+        employees = {emp_id: emp_data.get('archived_on', '') for emp_id, emp_data in storage.employees.items()}
+    
+    for line_no, text, emp_id, timestamp, direction in punches:
+        if emp_id is None:
+            rejected.append((line_no, text, "سطر غير مفهوم"))
+        elif timestamp is None:
+            rejected.append((line_no, text, "وقت غير صالح"))
+        elif direction == '?':
+            rejected.append((line_no, text, "نوع بصمة غير معروف"))
+        elif emp_id not in employees:
+            rejected.append((line_no, text, "كود الموظف غير مسجل"))
+        elif employees[emp_id] and format_timestamp(timestamp)[:10] > employees[emp_id]:
+            rejected.append((line_no, text, "الموظف مؤرشف"))
+        else:
+            by_employee[emp_id].append((timestamp, line_no, text, direction))
+    
+    events = []
+    for emp_id, emp_punches in by_employee.items():
+        check_cancelled(cancel_event)
+        emp_punches.sort()
+        
+        first_date = format_timestamp(emp_punches[0][0])[:10]
+        last_date = format_timestamp(emp_punches[-1][0])[:10]
+        known = [session for _, sessions in storage.sessions_between(emp_id, first_date, last_date)
+                 for session in sessions]
+        known_open = {session.check_in for session in known if session.is_open}
+        closed = sorted((session.check_in, session.check_out) for session in known if not session.is_open)
+        known_closed = {check_in for check_in, _ in closed} | {check_out for _, check_out in closed}
+        closed_starts = [check_in for check_in, _ in closed]
+        
+        def overlaps(start, end):
+            """هل تتداخل الفترة مع جلسة مغلقة مسجلة مسبقاً"""
+            i = bisect_right(closed_starts, end)
+            return i > 0 and closed[i - 1][1] >= start
+        
+        # الجلسة المفتوحة حالياً: (وقت الحضور, رقم السطر, النص) ورقم السطر None إذا كانت مسجلة مسبقاً
+        open_session = None
+        # الجلسة المفتوحة المسجلة تبدأ في الحساب عند أول بصمة بعد وقت حضورها
+        existing_open = storage.find_open_session(emp_id)
+        
+        last_time = None
+        for timestamp, line_no, text, direction in emp_punches:
+            if existing_open is not None and timestamp > existing_open.check_in:
+                if open_session is not None and open_session[1] is not None:
+                    rejected.append((open_session[1], open_session[2], "حضور بدون انصراف"))
+                open_session = (existing_open.check_in, None, None)
+                existing_open = None
+            
+            if last_time is not None and timestamp - last_time < DUPLICATE_PUNCH_SECONDS:
+                rejected.append((line_no, text, "بصمة مكررة"))
+                continue
+            last_time = timestamp
+            
+            if timestamp in known_closed:
+                # الملف نفسه أو جزء منه تم استيراده من قبل
+                rejected.append((line_no, text, "مسجلة مسبقاً"))
+                continue
+            
+            if direction is None:
+                direction = 'out' if open_session is not None else 'in'
+            
+            if direction == 'in':
+                if timestamp in known_open:
+                    open_session = (timestamp, None, None)
+                    if existing_open is not None and existing_open.check_in == timestamp:
+                        existing_open = None
+                    continue
+                if overlaps(timestamp, timestamp):
+                    rejected.append((line_no, text, "يتداخل مع جلسة مسجلة"))
+                    continue
+                if open_session is not None and open_session[1] is None:
+                    rejected.append((line_no, text, f"الموظف متحضر بالفعل من {format_timestamp(open_session[0])}"))
+                    continue
+                if open_session is not None and open_session[1] is not None:
+                    rejected.append((open_session[1], open_session[2], "حضور بدون انصراف"))
+                open_session = (timestamp, line_no, text)
+                continue
+            
+            if open_session is None:
+                rejected.append((line_no, text, "انصراف بدون حضور"))
+                continue
+            
+            check_in, in_line_no, in_text = open_session
+            open_session = None
+            if overlaps(check_in, timestamp):
+                if in_line_no is not None:
+                    rejected.append((in_line_no, in_text, "يتداخل مع جلسة مسجلة"))
+                rejected.append((line_no, text, "يتداخل مع جلسة مسجلة"))
+                continue
+            events.append({
+                'type': 'check_out',
+                'date': format_timestamp(check_in)[:10],
+                'emp_id': emp_id,
+                'check_in': format_timestamp(check_in),
+                'check_out': format_timestamp(timestamp)
+            })
+        
+        if open_session is not None and open_session[1] is not None and existing_open is not None:
+            # الجلسة المفتوحة المسجلة بعد آخر بصمة في الملف تبقى هي الجلسة المفتوحة الوحيدة
+            rejected.append((open_session[1], open_session[2], "حضور بدون انصراف"))
+        elif open_session is not None and open_session[1] is not None:
+            # آخر حضور في الملف بدون انصراف يبقى جلسة مفتوحة
+            events.append({
+                'type': 'check_in',
+                'date': format_timestamp(open_session[0])[:10],
+                'emp_id': emp_id,
+                'check_in': format_timestamp(open_session[0])
+            })
+    
+    rejected.sort()
+    return events, rejected
+
+
+def check_open_sessions(events, find_open_session):
+    """التأكد قبل الكتابة أن أحداث الدفعة لا تترك لأي موظف أكثر من جلسة مفتوحة
+    
+    البصمات قد تتغير بين قراءة الملف وتسجيله (جهاز آخر سجل حضوراً)، وعندها يُرفض الاستيراد كله.
+    """
+    open_check_ins = {}
+    for event in events:
+        emp_id = event['emp_id']
+        if emp_id not in open_check_ins:
+            session = find_open_session(emp_id)
+            open_check_ins[emp_id] = format_timestamp(session.check_in) if session is not None else None
+        if event['type'] == 'check_in':
+            if open_check_ins[emp_id] is not None:
+                raise StorageConflict(f"الموظف {emp_id} لديه جلسة حضور مفتوحة من {open_check_ins[emp_id]}، أعد الاستيراد")
+            open_check_ins[emp_id] = event['check_in']
+        elif open_check_ins[emp_id] == event['check_in']:
+            open_check_ins[emp_id] = None
+
+
+@METRICS.timed('import.punch_file')
+def import_punch_file(storage, path, cancel_event=None):
+    """استيراد ملف بصمات وتسجيله دفعة واحدة: (عدد الأحداث المسجلة, الصفوف المرفوضة)"""
+    events, rejected = pair_punches(storage, read_punch_file(path), cancel_event)
+    check_cancelled(cancel_event)
+    if events:
+        storage.record_punches(events)
+    return len(events), rejected
+
+
+def write_rejected_punches(path, rejected):
+    """كتابة الصفوف المرفوضة وسبب رفض كل منها في ملف CSV"""
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['رقم السطر', 'السطر', 'السبب'])
+        writer.writerows(rejected)
+
+
+# عناوين أعمدة كل نوع تقرير وعرضها في ملف PDF
+REPORT_COLUMNS = {
+    'daily': (['كود الموظف', 'اسم الموظف', 'وقت الحضور', 'وقت الانصراف', 'الساعات', 'الراتب'],
+              [25, 35, 35, 35, 25, 25]),
+    'monthly': (['التاريخ', 'وقت الحضور', 'وقت الانصراف', 'الساعات', 'الراتب'],
+                [35, 35, 35, 25, 25]),
+    'payroll': (['كود الموظف', 'اسم الموظف', 'القسم', 'أيام الحضور', 'الساعات', 'الراتب'],
+                [25, 45, 35, 25, 25, 35]),
+}
+
+
+def timestamp_to_datetime(timestamp):
+    """تحويل عدد الثواني إلى datetime لصفوف التقارير"""
+    if timestamp is None:
+        return None
+    return _EPOCH + timedelta(seconds=timestamp)
+
+
+def format_report_value(value):
+    """تحويل قيمة من صفوف التقرير إلى ما يُعرض في الجدول أو ملف PDF"""
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime(TIME_FORMAT)
+    return value
+
+
+class ReportResult:
+    """نتيجة تقرير بقيمها الأصلية (أوقات وأرقام)، والتنسيق يتم فقط عند العرض أو التصدير"""
+    
+    def __init__(self, kind, title, rows):
+        self.kind = kind
+        self.title = title
+        self.headers, self.col_widths = REPORT_COLUMNS[kind]
+        # [(القيم, الوسوم)] وصفوف الإجمالي وسمها 'total'
+        self.rows = rows
+
+
+def estimate_result_size(result):
+    """تقدير حجم صفوف نتيجة تقرير في الذاكرة بالبايت"""
+    size = sys.getsizeof(result.rows)
+    for values, tags in result.rows:
+        size += sys.getsizeof(values) + sys.getsizeof(tags) + sum(sys.getsizeof(value) for value in values)
+    return size
+
+
+class ReportCache:
+    """ذاكرة مؤقتة لنتائج التقارير: الأقدم استخداماً يُحذف أولاً عند تجاوز حد الذاكرة
+    
+    كل نتيجة تُحفظ مع ما تغطيه (الموظف أو None لكل الموظفين، والقسم، والفترة)، وأي بصمة أو
+    تعديل يحذف فقط النتائج التي تغطي الموظف والتاريخ المتأثرين.
+    """
+    
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # {المفتاح: (النتيجة, الحجم, الموظف, القسم, بداية الفترة, نهايتها)} بترتيب آخر استخدام
+        self.entries = OrderedDict()
+        self.size = 0
+        # يزيد مع كل حذف، فلا تُحفظ نتيجة بدأ حسابها قبل تعديل وصل أثناء الحساب
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        """النتيجة المحفوظة للمفتاح أو None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, key, result, generation, emp_id=None, department='', start_date='', end_date=''):
+        """حفظ نتيجة حُسبت عند الجيل generation (لا تُحفظ إذا تغيرت البيانات أثناء حسابها)"""
+        size = estimate_result_size(result)
+        with self.lock:
+            if generation != self.generation or size > self.max_bytes:
+                return
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self.entries[key] = (result, size, emp_id, department, start_date, end_date)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted[1]
+    
+    def invalidate(self, emp_id, date=None, department=None):
+        """حذف النتائج التي تغطي الموظف في التاريخ (كل التواريخ إذا كان None) وفي قسمه (كل الأقسام إذا كان None)"""
+        with self.lock:
+            self.generation += 1
+            for key, (_, size, entry_emp, entry_department, start_date, end_date) in list(self.entries.items()):
+                if entry_emp is not None and entry_emp != emp_id:
+                    continue
+                if entry_department and department is not None and entry_department != department:
+                    continue
+                if date is not None and not start_date <= date <= end_date:
+                    continue
+                del self.entries[key]
+                self.size -= size
+    
+    def clear(self):
+        """حذف كل النتائج"""
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.size = 0
+
+
+class JobCancelled(Exception):
+    """تم إلغاء عملية تعمل في الخلفية"""
+
+
+def check_cancelled(cancel_event):
+    """إيقاف العملية إذا طلب المستخدم إلغاءها"""
+    if cancel_event is not None and cancel_event.is_set():
+        raise JobCancelled()
+
+
+def calculate_hourly_rate(monthly_salary):
+    """حساب سعر الساعة من سعر الساعه"""
+    return round(monthly_salary / 26, 2)
+
+
+def to_hundredths(value):
+    """تحويل ساعات أو مبلغ مقرب لمنزلتين إلى عدد صحيح من أجزاء المئة"""
+    return round(value * 100)
+
+
+def salary_cents(rate_cents, hours_hundredths):
+    """الراتب بالقروش من سعر الساعة بالقروش والساعات بأجزاء المئة (النصف يُقرب لأعلى)
+    
+    عمليات صحيحة فقط، فتعمل على الأعداد وعلى أعمدة numpy/pandas بنفس النتيجة.
+    """
+    return (rate_cents * hours_hundredths + 50) // 100
+
+
+def calculate_salary(hourly_rate, hours):
+    """حساب الراتب من سعر الساعة وعدد الساعات"""
+    return salary_cents(to_hundredths(hourly_rate), to_hundredths(hours)) / 100
+
+
+def rollup_totals(storage, start_date, end_date, hourly_rates, cancel_event=None):
+    """إجمالي كل موظف لفترة من الملخصات: {كود الموظف: [الأيام, الساعات, الراتب]}
+    
+    الأشهر الكاملة تُقرأ من ملخصات الأشهر، وأطراف الفترة من ملخصات الأيام. إذا تغير سعر ساعة
+    الموظف بعد حساب ملخص شهره يُعاد حساب راتبه من أيام ذلك الشهر.
+    """
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    
+    def add_days(days, emp_ids=None):
+        for emp_id, _, hours, _, _ in days:
+            if emp_id in hourly_rates and (emp_ids is None or emp_id in emp_ids):
+                total = totals[emp_id]
+                total[0] += 1
+                total[1] += hours
+                total[2] += calculate_salary(hourly_rates[emp_id], hours)
+    
+    for month, first, last, is_full in month_ranges(start_date, end_date):
+        check_cancelled(cancel_event)
+        if not is_full:
+            add_days(storage.day_rollups(first, last))
+            continue
+        
+        changed_rate = set()
+        for emp_id, (days, hours, hourly_rate, salary) in storage.month_rollups(month).items():
+            if emp_id not in hourly_rates:
+                continue
+            if hourly_rate != hourly_rates[emp_id]:
+                changed_rate.add(emp_id)
+                continue
+            total = totals[emp_id]
+            total[0] += days
+            total[1] += hours
+            total[2] += salary
+        if changed_rate:
+            add_days(storage.day_rollups(first, last), changed_rate)
+    return totals
+
+
+def verify_rollups(storage, cancel_event=None):
+    """مقارنة إجماليات كل شهر من الملخصات بحسابها من الجلسات مباشرة
+    
+    تُرجع الاختلافات: [(الشهر, كود الموظف, (الأيام, الساعات, الراتب) من الملخصات, نفس القيم من الجلسات)]
+    """
+    storage.refresh()
+    with storage.lock:
+        hourly_rates = {emp_id: emp_data['hourly_rate'] for emp_id, emp_data in storage.employees.items()}
+    sessions = [session for session in storage.closed_sessions_between('0000-01-01', '9999-12-31')
+                if session.emp_id in hourly_rates]
+    months = {session.date[:7] for session in sessions}
+    months.update(date[:7] for _, date, _, _, _ in storage.day_rollups('0000-01-01', '9999-12-31'))
+    
+    table = build_session_table(sessions)
+    table['month'] = [date[:7] for date in table['date']]
+    expected = {}
+    for month, month_table in table.groupby('month', sort=False):
+        per_employee, _ = compute_payroll(month_table, hourly_rates)
+        for emp_id, days, hours, salary in zip(per_employee.index, per_employee['days'],
+                                               per_employee['hours'], per_employee['salary']):
+            expected[month, emp_id] = (int(days), float(hours), float(salary))
+    
+    mismatches = []
+    for month in sorted(months):
+        check_cancelled(cancel_event)
+        totals = rollup_totals(storage, month + '-01', month_end(month), hourly_rates)
+        for emp_id in sorted(set(totals) | {emp_id for key_month, emp_id in expected if key_month == month}):
+            days, hours, salary = totals.get(emp_id, (0, 0.0, 0.0))
+            from_rollups = (days, round(hours, 2), round(salary, 2))
+            from_sessions = expected.get((month, emp_id), (0, 0.0, 0.0))
+            if from_rollups != from_sessions:
+                mismatches.append((month, emp_id, from_rollups, from_sessions))
+    return mismatches
+
+
+def cached_report(storage, key, build, emp_id=None, department='', start_date='', end_date=''):
+    """نتيجة التقرير من الذاكرة المؤقتة للتخزين، أو حسابها بـ build() وحفظها مع ما تغطيه"""
+    storage.refresh()
+    cache = storage.report_cache
+    generation = cache.generation
+    result = cache.get(key)
+    if result is None:
+        result = build()
+        cache.put(key, result, generation, emp_id, department, start_date, end_date)
+    return result
+
+
+@METRICS.timed('report.daily')
+def build_daily_report(storage, report_date, cancel_event=None):
+    """التقرير اليومي (من الذاكرة المؤقتة إذا لم تتغير جلسات اليوم)"""
+    return cached_report(storage, ('daily', report_date),
+                         lambda: compute_daily_report(storage, report_date, cancel_event),
+                         start_date=report_date, end_date=report_date)
+
+
+def compute_daily_report(storage, report_date, cancel_event=None):
+    """حساب التقرير اليومي"""
+    rows = []
+    with storage.lock:
+        employees = dict(storage.employees)
+    
+    for emp_id, sessions in storage.sessions_on(report_date).items():
+        check_cancelled(cancel_event)
+        
+        if emp_id in employees:
+            emp_name = employees[emp_id]['name']
+            hourly_rate = employees[emp_id]['hourly_rate']
+            total_hours = 0
+            
+            for i, session in enumerate(sessions, 1):
+                hours = None
+                salary = None
+                if not session.is_open:
+                    hours = session.hours
+                    total_hours += hours
+                    salary = calculate_salary(hourly_rate, hours)
+                
+                rows.append(((f"{emp_id} ({i})", emp_name, timestamp_to_datetime(session.check_in),
+                              timestamp_to_datetime(session.check_out), hours, salary), ()))
+            
+            if total_hours > 0:
+                total_salary = calculate_salary(hourly_rate, total_hours)
+                rows.append(((f"{emp_id} (الإجمالي)", emp_name, None, None, total_hours, total_salary),
+                             ('total',)))
+    return ReportResult('daily', f"تقرير الحضور اليومي - {report_date}", rows)
+
+
+@METRICS.timed('report.monthly')
+def build_monthly_report(storage, emp_id, start_date, end_date, period_label, cancel_event=None):
+    """تقرير موظف لفترة (من الذاكرة المؤقتة إذا لم تتغير جلساته فيها)"""
+    return cached_report(storage, ('monthly', emp_id, start_date, end_date, period_label),
+                         lambda: compute_monthly_report(storage, emp_id, start_date, end_date, period_label,
+                                                        cancel_event),
+                         emp_id=emp_id, start_date=start_date, end_date=end_date)
+
+
+def compute_monthly_report(storage, emp_id, start_date, end_date, period_label, cancel_event=None):
+    """حساب تقرير موظف لفترة، وتكون صفوفه فارغة إذا لم توجد ساعات"""
+    title = f"تقرير الحضور للفترة - {period_label} للموظف {emp_id}"
+    rows = []
+    hourly_rate = storage.employees[emp_id]['hourly_rate']
+    
+    total_period_hours = 0
+    total_period_salary = 0
+    
+    # ملخصات الأيام تحتوي فقط الأيام التي بها ساعات
+    for _, date_str, day_total, first_checkin, last_checkout in storage.day_rollups(start_date, end_date, emp_id):
+        check_cancelled(cancel_event)
+        
+        total_period_hours += day_total
+        day_salary = calculate_salary(hourly_rate, day_total)
+        total_period_salary += day_salary
+        
+        rows.append(((date_str, timestamp_to_datetime(first_checkin), timestamp_to_datetime(last_checkout),
+                      day_total, day_salary), ()))
+    
+    if total_period_hours <= 0:
+        return ReportResult('monthly', title, [])
+    
+    rows.append(((f"الإجمالي ({period_label})", None, None, total_period_hours, total_period_salary),
+                 ('total',)))
+    return ReportResult('monthly', title, rows)
+
+
+@METRICS.timed('report.payroll')
+def build_payroll_report(storage, start_date, end_date, department, period_label, cancel_event=None):
+    """تقرير الرواتب (من الذاكرة المؤقتة إذا لم تتغير جلسات الفترة لموظفي القسم)"""
+    return cached_report(storage, ('payroll', start_date, end_date, department, period_label),
+                         lambda: compute_payroll_report(storage, start_date, end_date, department, period_label,
+                                                        cancel_event),
+                         department=department, start_date=start_date, end_date=end_date)
+
+
+def compute_payroll_report(storage, start_date, end_date, department, period_label, cancel_event=None):
+    """حساب تقرير الرواتب، وتكون صفوفه فارغة إذا لم توجد ساعات"""
+    title = f"تقرير الرواتب للفترة - {period_label}"
+    if department:
+        title += f" لقسم {department}"
+    
+    with storage.lock:
+        employees = {
+            emp_id: emp_data for emp_id, emp_data in storage.employees.items()
+            if not department or emp_data.get('department', '') == department
+        }
+    hourly_rates = {emp_id: emp_data['hourly_rate'] for emp_id, emp_data in employees.items()}
+    totals = rollup_totals(storage, start_date, end_date, hourly_rates, cancel_event)
+    
+    # الموظفون النشطون يظهرون في التقرير حتى من لم يحضر أي يوم، والمؤرشفون فقط إذا كانت لهم ساعات
+    rows = []
+    for emp_id, emp_data in employees.items():
+        if is_archived(emp_data) and emp_id not in totals:
+            continue
+        days, hours, salary = totals.get(emp_id, (0, 0.0, 0.0))
+        rows.append(((emp_id, emp_data['name'], emp_data.get('department', ''),
+                      days, round(hours, 2), round(salary, 2)), ()))
+    
+    total_hours = round(sum(values[4] for values, _ in rows), 2)
+    if total_hours <= 0:
+        return ReportResult('payroll', title, [])
+    
+    rows.append(((f"الإجمالي ({period_label})", None, department, sum(values[3] for values, _ in rows),
+                  total_hours, round(sum(values[5] for values, _ in rows), 2)), ('total',)))
+    return ReportResult('payroll', title, rows)
+
+
+@METRICS.timed('export.pdf')
+def write_pdf(file_path, result, cancel_event=None):
+    """كتابة التقرير في ملف PDF صفاً بصف مع تكرار رؤوس الأعمدة في كل صفحة"""
+    from fpdf import FPDF
+    
+    col_widths = result.col_widths
+    
+    pdf = FPDF()
+    pdf.add_page()
+    
+    try:
+        pdf.add_font('Arial', '', 'arial.ttf', uni=True)
+        pdf.set_font('Arial', '', 12)
+    except:
+        pdf.set_font('Arial', '', 12)
+    
+    pdf.cell(0, 10, result.title, 0, 1, 'C')
+    pdf.ln(10)
+    
+    def write_headers():
+        for i, header in enumerate(result.headers):
+            pdf.cell(col_widths[i], 10, header, 1, 0, 'C')
+        pdf.ln()
+    
+    write_headers()
+    
+    for values, tags in result.rows:
+        check_cancelled(cancel_event)
+        
+        if pdf.get_y() + 10 > pdf.page_break_trigger:
+            pdf.add_page()
+            write_headers()
+        
+        if 'total' in tags:
+            pdf.set_font('Arial', 'B', 12)
+            pdf.cell(sum(col_widths[:-2]), 10, f"{values[0]}:", 1, 0, 'R')
+            pdf.cell(col_widths[-2], 10, str(format_report_value(values[-2])), 1, 0, 'C')
+            pdf.cell(col_widths[-1], 10, str(format_report_value(values[-1])), 1, 0, 'C')
+            pdf.set_font('Arial', '', 12)
+        else:
+            for i, value in enumerate(values):
+                pdf.cell(col_widths[i], 10, str(format_report_value(value)), 1, 0, 'C')
+        pdf.ln()
+    
+    pdf.output(file_path)
+
+
+@METRICS.timed('export.xlsx')
+def write_excel(file_path, result, cancel_event=None):
+    """كتابة التقرير في ملف Excel صفاً بصف (وضع الكتابة فقط) مع الحفاظ على الأنواع"""
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(result.headers)
+    
+    for values, _ in result.rows:
+        check_cancelled(cancel_event)
+        sheet.append(list(values))
+    
+    workbook.save(file_path)
+
+
+@METRICS.timed('export.csv')
+def write_csv(file_path, result, cancel_event=None):
+    """كتابة التقرير في ملف CSV (بترميز يفتحه Excel بالعربية مباشرة)"""
+    with open(file_path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(result.headers)
+        for values, _ in result.rows:
+            check_cancelled(cancel_event)
+            writer.writerow([format_report_value(value) for value in values])
+
+
+# صيغ التصدير المتاحة ودالة كتابة كل منها
+EXPORT_WRITERS = {
+    'pdf': write_pdf,
+    'xlsx': write_excel,
+    'csv': write_csv,
+}
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attendance_core import open_storage  # noqa: E402
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def storage(request, tmp_path):
+    """تخزين فارغ من كل نوع به موظف واحد كوده 1"""
+    storage = open_storage(request.param, str(tmp_path / 'data'))
+    storage.add_employee('1', {'name': 'أحمد', 'department': 'المبيعات', 'monthly_salary': 2600})
+    yield storage
+    storage.close()
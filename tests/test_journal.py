@@ -0,0 +1,65 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from unittest import mock
+
+from attendance_core import PunchJournal, open_storage, to_timestamp
+
+
+def punch_day(storage, emp_id, count):
+    """بصمات حضور وانصراف متتالية لموظف في يوم واحد"""
+    start = datetime(2024, 5, 1, 8)
+    for i in range(count):
+        moment = to_timestamp(start + timedelta(minutes=i))
+        if i % 2 == 0:
+            storage.add_check_in(emp_id, '2024-05-01', moment)
+        else:
+            storage.close_session(storage.find_open_session(emp_id), moment)
+
+
+def test_punch_returns_after_fsync(tmp_path):
+    storage = open_storage('json', str(tmp_path / 'data'), commit_window_ms=20)
+    storage.add_employee('1', {'name': 'أحمد', 'department': '', 'monthly_salary': 2600})
+    
+    synced = []
+    real_fsync = os.fsync
+    
+    def fsync(fileno):
+        real_fsync(fileno)
+        synced.append(storage.journal.entries)
+    
+    with mock.patch('attendance_core.os.fsync', side_effect=fsync):
+        punch_day(storage, '1', 1)
+        # لا تأكيد للبصمة قبل fsync يغطيها
+        assert synced and synced[-1] == storage.journal.entries
+    storage.close()
+
+
+def test_concurrent_punches_share_fsyncs(tmp_path):
+    storage = open_storage('json', str(tmp_path / 'data'))
+    emp_ids = [str(i) for i in range(8)]
+    for emp_id in emp_ids:
+        storage.add_employee(emp_id, {'name': 'موظف', 'department': '', 'monthly_salary': 2600})
+    
+    with mock.patch('attendance_core.os.fsync', wraps=os.fsync) as fsync:
+        threads = [threading.Thread(target=punch_day, args=(storage, emp_id, 20)) for emp_id in emp_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert fsync.call_count < len(emp_ids) * 20
+    storage.close()
+    
+    storage = open_storage('json', str(tmp_path / 'data'))
+    assert len(storage.closed_sessions_between('2024-05-01', '2024-05-01')) == len(emp_ids) * 10
+    storage.close()
+
+
+def test_close_syncs_pending_events(tmp_path):
+    journal = PunchJournal(str(tmp_path / 'attendance.journal'))
+    journal.reset()
+    journal.append({'type': 'check_in', 'emp_id': '1'})
+    with mock.patch('attendance_core.os.fsync', wraps=os.fsync) as fsync:
+        journal.close()
+    assert fsync.call_count == 1
+    assert len(PunchJournal(journal.path).read()) == 1
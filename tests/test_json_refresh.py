@@ -0,0 +1,54 @@
+import os
+from unittest import mock
+
+from attendance_core import FileLock, open_storage
+
+
+def test_unlocked_refresh_reads_other_kiosk_without_file_lock(tmp_path):
+    data_dir = str(tmp_path / 'data')
+    storage = open_storage('json', data_dir)
+    other = open_storage('json', data_dir)
+    other.add_employee('1', {'name': 'أحمد', 'department': '', 'monthly_salary': 2600})
+    
+    with mock.patch.object(FileLock, 'acquire') as acquire:
+        storage.refresh(locked=False)
+    assert acquire.call_count == 0
+    assert '1' in storage.employees
+    other.close()
+    storage.close()
+
+
+def test_unlocked_refresh_keeps_torn_line(tmp_path):
+    data_dir = str(tmp_path / 'data')
+    storage = open_storage('json', data_dir)
+    storage.add_employee('1', {'name': 'أحمد', 'department': '', 'monthly_salary': 2600})
+    # جهاز آخر ما زال يكتب سطره
+    with open(storage.journal.path, 'ab') as f:
+        f.write(b'{"type": "add_employee", "emp_id": "2"')
+    size = os.path.getsize(storage.journal.path)
+    
+    storage.refresh(locked=False)
+    assert os.path.getsize(storage.journal.path) == size
+    assert '2' not in storage.employees
+    
+    with open(storage.journal.path, 'ab') as f:
+        f.write(b', "data": {"name": "\\u0633\\u0627\\u0631\\u0629", "department": "", "monthly_salary": 5200}}\n')
+    storage.refresh(locked=False)
+    assert storage.employees['2']['monthly_salary'] == 5200
+    storage.close()
+
+
+def test_unlocked_refresh_leaves_reload_after_compaction_to_writes(tmp_path):
+    data_dir = str(tmp_path / 'data')
+    storage = open_storage('json', data_dir)
+    other = open_storage('json', data_dir)
+    other.add_employee('1', {'name': 'أحمد', 'department': '', 'monthly_salary': 2600})
+    other.save()
+    
+    with mock.patch.object(storage, 'load') as load:
+        storage.refresh(locked=False)
+    assert load.call_count == 0
+    storage.refresh()
+    assert '1' in storage.employees
+    other.close()
+    storage.close()
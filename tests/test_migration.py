@@ -0,0 +1,52 @@
+import json
+import os
+from unittest import mock
+
+from attendance_core import JsonStorage, migrate_json_storage, open_storage, read_snapshot, write_snapshot
+
+
+def write_legacy(data_dir):
+    """مجلد بيانات بالصيغة 0: attendance.json واحد بأوقات نصية"""
+    os.makedirs(data_dir)
+    with open(os.path.join(data_dir, 'employees.json'), 'w', encoding='utf-8') as f:
+        json.dump({'1': {'name': 'أحمد', 'department': 'المبيعات', 'monthly_salary': 2600},
+                   '2': {'name': 'سارة', 'department': '', 'monthly_salary': 5200}}, f)
+    with open(os.path.join(data_dir, 'attendance.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            '2024-04-30': {'1': {'check_in': '2024-04-30 08:00:00', 'check_out': '2024-04-30 16:00:00'}},
+            '2024-05-02': {'1': [{'check_in': '2024-05-02 08:00:00', 'check_out': '2024-05-02 12:00:00'}],
+                           '2': {'check_in': '2024-05-02 09:00:00', 'check_out': '2024-05-02 17:00:00'}},
+        }, f)
+
+
+def manifest(data_dir):
+    return read_snapshot(os.path.join(data_dir, 'attendance', 'manifest.json'))[1]
+
+
+def test_migration_writes_employee_months(tmp_path):
+    data_dir = str(tmp_path / 'data')
+    write_legacy(data_dir)
+    migrate_json_storage(data_dir)
+    
+    assert manifest(data_dir)['employee_months'] == {'1': ['2024-04', '2024-05'], '2': ['2024-05']}
+    
+    storage = open_storage('json', data_dir)
+    with mock.patch.object(JsonStorage, 'load_all') as load_all:
+        storage.remove_employee('2')
+    assert load_all.call_count == 0
+    assert manifest(data_dir)['employee_months'] == {'1': ['2024-04', '2024-05']}
+    storage.close()
+
+
+def test_missing_employee_months_is_added_on_open(tmp_path):
+    data_dir = str(tmp_path / 'data')
+    write_legacy(data_dir)
+    migrate_json_storage(data_dir)
+    # فهرس كتبه ترحيل أقدم بدون أشهر الموظفين
+    old_manifest = manifest(data_dir)
+    del old_manifest['employee_months']
+    write_snapshot(os.path.join(data_dir, 'attendance', 'manifest.json'), old_manifest)
+    
+    storage = open_storage('json', data_dir)
+    assert storage.employee_months == {'1': {'2024-04', '2024-05'}, '2': {'2024-05'}}
+    storage.close()
@@ -0,0 +1,97 @@
+from datetime import datetime
+
+import pytest
+
+from attendance_core import METRICS, StorageConflict, import_punch_file, pair_punches, to_timestamp
+
+
+def punch(line_no, text, direction):
+    """بصمة بصيغة read_punch_file للموظف 1"""
+    return line_no, text, '1', to_timestamp(datetime.strptime(text, '%Y-%m-%d %H:%M')), direction
+
+
+def check_in(storage, text):
+    """تسجيل حضور مفتوح للموظف 1"""
+    return storage.add_check_in('1', text[:10], to_timestamp(datetime.strptime(text, '%Y-%m-%d %H:%M')))
+
+
+def all_sessions(storage):
+    return [session for _, sessions in storage.sessions_between('1', '2024-01-01', '2024-12-31')
+            for session in sessions]
+
+
+def test_in_after_existing_open_session_is_rejected(storage):
+    check_in(storage, '2024-10-01 08:00')
+    events, rejected = pair_punches(storage, [
+        punch(2, '2024-10-02 08:00', 'in'),
+        punch(3, '2024-10-02 17:00', 'out'),
+    ])
+    
+    assert [line_no for line_no, _, _ in rejected] == [2]
+    assert len(events) == 1
+    assert events[0]['check_in'] == '2024-10-01 08:00:00'
+    assert events[0]['check_out'] == '2024-10-02 17:00:00'
+    
+    storage.record_punches(events)
+    assert storage.find_open_session('1') is None
+    assert len(all_sessions(storage)) == 1
+
+
+def test_open_in_before_existing_open_session_is_rejected(storage):
+    existing = check_in(storage, '2024-10-05 09:00')
+    events, rejected = pair_punches(storage, [punch(2, '2024-10-03 08:00', 'in')])
+    
+    assert events == []
+    assert rejected == [(2, '2024-10-03 08:00', "حضور بدون انصراف")]
+    assert storage.find_open_session('1').check_in == existing.check_in
+
+
+def test_closed_pair_before_existing_open_session_is_kept(storage):
+    existing = check_in(storage, '2024-10-05 09:00')
+    events, rejected = pair_punches(storage, [
+        punch(2, '2024-10-03 08:00', 'in'),
+        punch(3, '2024-10-03 16:00', 'out'),
+    ])
+    
+    assert rejected == []
+    storage.record_punches(events)
+    assert storage.find_open_session('1').check_in == existing.check_in
+    assert len(all_sessions(storage)) == 2
+
+
+def test_reimported_open_session_is_closed(storage):
+    check_in(storage, '2024-10-01 08:00')
+    events, rejected = pair_punches(storage, [
+        punch(2, '2024-10-01 08:00', None),
+        punch(3, '2024-10-01 16:00', None),
+    ])
+    
+    assert rejected == []
+    storage.record_punches(events)
+    assert storage.find_open_session('1') is None
+    assert [session.hours for session in all_sessions(storage)] == [8.0]
+
+
+def test_record_punches_rejects_second_open_session(storage):
+    events, _ = pair_punches(storage, [punch(2, '2024-10-02 08:00', 'in')])
+    # جهاز آخر سجل حضوراً بين قراءة الملف وتسجيله
+    check_in(storage, '2024-10-02 09:00')
+    
+    with pytest.raises(StorageConflict):
+        storage.record_punches(events)
+    assert storage.find_open_session('1').date == '2024-10-02'
+    assert len(all_sessions(storage)) == 1
+
+
+def test_import_punch_file(storage, tmp_path):
+    path = tmp_path / 'punches.csv'
+    path.write_text("emp_id,time,type\n1,2024-10-01 08:00,in\n1,2024-10-01 16:30,out\n2,2024-10-01 08:00,in\n",
+                    encoding='utf-8')
+    
+    METRICS.reset()
+    imported, rejected = import_punch_file(storage, str(path))
+    
+    assert METRICS.summary()['import.punch_file']['count'] == 1
+    assert imported == 1
+    assert rejected == [(4, '2,2024-10-01 08:00,in', "كود الموظف غير مسجل")]
+    assert [session.hours for session in all_sessions(storage)] == [8.5]
@@ -0,0 +1,124 @@
+import json
+import os
+import sys
+from array import array
+from datetime import datetime
+
+import pytest
+
+from attendance_core import (
+    _align, convert_json_storage, decode_partition, encode_partition, open_storage, read_snapshot, to_timestamp,
+)
+
+
+def at(text):
+    return to_timestamp(datetime.strptime(text, '%Y-%m-%d %H:%M'))
+
+
+def month_days():
+    """شهر فيه عدة موظفين وجلسات في نفس اليوم وجلسة مفتوحة"""
+    return {
+        '2024-05-01': {'1': [[at('2024-05-01 08:00'), at('2024-05-01 12:00')],
+                             [at('2024-05-01 13:00'), at('2024-05-01 17:30')]],
+                       '22': [[at('2024-05-01 07:45'), at('2024-05-01 16:00')]]},
+        '2024-05-31': {'1': [[at('2024-05-31 08:00'), None]],
+                       '333': [[at('2024-05-31 22:00'), at('2024-06-01 06:00')]]},
+    }
+
+
+def meta(body):
+    return json.loads(body[:body.index(b'\n')])
+
+
+def test_round_trip_with_open_session():
+    days = month_days()
+    body = encode_partition(days)
+    
+    assert decode_partition(body) == days
+    assert meta(body)['base'] == at('2024-05-01 07:45')
+
+
+def test_empty_month():
+    assert decode_partition(encode_partition({})) == {}
+
+
+@pytest.mark.parametrize('emp_id', ['1', '12', '123', '1234'])
+def test_columns_are_aligned(emp_id):
+    # أطوال مختلفة لسطر الوصف تعطي كل قيم الحشو قبل أول عمود
+    days = {'2024-05-01': {emp_id: [[at('2024-05-01 08:00'), at('2024-05-01 16:00')]]}}
+    body = encode_partition(days)
+    offset = len(json.dumps(meta(body), ensure_ascii=False, separators=(',', ':')).encode('utf-8')) + 1
+    for _, typecode in meta(body)['columns']:
+        offset = _align(offset)
+        assert offset % 4 == 0
+        offset += array(typecode).itemsize
+    assert offset == len(body)
+    assert decode_partition(body) == days
+
+
+def test_employee_column_switches_to_32_bit():
+    start = at('2024-05-01 08:00')
+    days = {'2024-05-01': {str(i): [[start + i, start + i + 3600]] for i in range(2 ** 16)}}
+    body = encode_partition(days)
+    
+    assert dict(meta(body)['columns'])['emp'] == 'I'
+    assert decode_partition(body) == days
+    
+    days = {'2024-05-01': {str(i): [[start + i, start + i + 3600]] for i in range(10)}}
+    assert dict(meta(encode_partition(days))['columns'])['emp'] == 'H'
+
+
+def test_other_byteorder_is_swapped():
+    days = month_days()
+    body = encode_partition(days)
+    header = meta(body)
+    
+    # نفس الملف كما يكتبه جهاز بترتيب بايتات مختلف
+    header['byteorder'] = 'big' if sys.byteorder == 'little' else 'little'
+    foreign = bytearray(json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n')
+    offset = body.index(b'\n') + 1
+    for _, typecode in header['columns']:
+        column = array(typecode)
+        offset = _align(offset)
+        size = column.itemsize * header['rows']
+        column.frombytes(body[offset:offset + size])
+        column.byteswap()
+        offset += size
+        foreign.extend(bytes(_align(len(foreign)) - len(foreign)))
+        foreign.extend(column.tobytes())
+    
+    assert decode_partition(bytes(foreign)) == days
+
+
+def stored_sessions(data_dir):
+    storage = open_storage('json', data_dir)
+    storage.load_all()
+    sessions = sorted((session.emp_id, session.check_in, session.check_out)
+                      for timeline in storage.timelines.values() for session in timeline)
+    storage.close()
+    return sessions
+
+
+def test_convert_json_to_binary_and_back(tmp_path):
+    data_dir = str(tmp_path / 'data')
+    storage = open_storage('json', data_dir)
+    storage.add_employee('1', {'name': 'أحمد', 'department': 'المبيعات', 'monthly_salary': 2600})
+    storage.add_employee('2', {'name': 'سارة', 'department': '', 'monthly_salary': 5200})
+    storage.close_session(storage.add_check_in('1', '2024-04-30', at('2024-04-30 08:00')), at('2024-04-30 16:00'))
+    storage.close_session(storage.add_check_in('2', '2024-05-02', at('2024-05-02 09:00')), at('2024-05-02 17:00'))
+    storage.add_check_in('1', '2024-05-03', at('2024-05-03 08:00'))
+    storage.close()
+    expected = stored_sessions(data_dir)
+    assert ('1', at('2024-05-03 08:00'), None) in expected
+    month_path = os.path.join(data_dir, 'attendance', '2024-05.json')
+    
+    convert_json_storage(data_dir, 'binary')
+    with open(month_path, 'rb') as f:
+        assert json.loads(f.readline())['encoding'] == 'binary'
+    assert read_snapshot(os.path.join(data_dir, 'attendance', 'manifest.json'))[1]['encoding'] == 'binary'
+    assert stored_sessions(data_dir) == expected
+    
+    convert_json_storage(data_dir, 'json')
+    with open(month_path, 'rb') as f:
+        assert json.loads(f.readline())['encoding'] == 'json'
+    assert stored_sessions(data_dir) == expected
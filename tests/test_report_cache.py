@@ -0,0 +1,81 @@
+from datetime import datetime
+
+from attendance_core import (
+    ReportCache, ReportResult, build_monthly_report, build_payroll_report, cached_report, estimate_result_size,
+    to_timestamp,
+)
+
+
+def result(name='x'):
+    return ReportResult('daily', name, [((name, 'أحمد', None, None, 8.0, 800.0), ())])
+
+
+def test_invalidate_drops_only_entries_covering_employee_date_and_department():
+    cache = ReportCache()
+    covered = {
+        ('monthly', 'A'): ('A', '', '2024-05-01', '2024-05-31'),
+        ('payroll', 'sales'): (None, 'المبيعات', '2024-05-01', '2024-05-31'),
+        ('payroll', 'all'): (None, '', '2024-05-01', '2024-05-31'),
+        ('daily', 'D'): (None, '', '2024-05-10', '2024-05-10'),
+    }
+    kept = {
+        ('monthly', 'A', 'june'): ('A', '', '2024-06-01', '2024-06-30'),
+        ('monthly', 'B'): ('B', '', '2024-05-01', '2024-05-31'),
+        ('payroll', 'stores'): (None, 'المخازن', '2024-05-01', '2024-05-31'),
+        ('daily', 'other'): (None, '', '2024-05-11', '2024-05-11'),
+    }
+    for key, scope in {**covered, **kept}.items():
+        cache.put(key, result(), cache.generation, *scope)
+    
+    cache.invalidate('A', '2024-05-10', 'المبيعات')
+    
+    assert set(cache.entries) == set(kept)
+    assert cache.size == sum(entry[1] for entry in cache.entries.values())
+
+
+def test_put_after_invalidation_during_computation_is_discarded():
+    cache = ReportCache()
+    generation = cache.generation
+    # بصمة وصلت أثناء حساب التقرير
+    cache.invalidate('A', '2024-05-10', '')
+    cache.put(('monthly', 'A'), result(), generation, 'A', '', '2024-05-01', '2024-05-31')
+    
+    assert cache.get(('monthly', 'A')) is None
+    assert cache.size == 0
+
+
+def test_least_recently_used_entries_are_evicted():
+    size = estimate_result_size(result('a'))
+    cache = ReportCache(max_bytes=size * 2)
+    cache.put('a', result('a'), cache.generation)
+    cache.put('b', result('b'), cache.generation)
+    cache.get('a')
+    cache.put('c', result('c'), cache.generation)
+    
+    assert list(cache.entries) == ['a', 'c']
+    assert cache.size <= cache.max_bytes
+    cache.put('d', result('d'), cache.generation)
+    assert list(cache.entries) == ['c', 'd']
+
+
+def test_punch_invalidates_cached_reports(storage):
+    storage.add_employee('2', {'name': 'سارة', 'department': 'المخازن', 'monthly_salary': 5200})
+    build_monthly_report(storage, '1', '2024-05-01', '2024-05-31', 'مايو')
+    build_monthly_report(storage, '2', '2024-05-01', '2024-05-31', 'مايو')
+    build_payroll_report(storage, '2024-05-01', '2024-05-31', 'المخازن', 'مايو')
+    
+    check_in = to_timestamp(datetime(2024, 5, 10, 8))
+    storage.close_session(storage.add_check_in('1', '2024-05-10', check_in), check_in + 8 * 3600)
+    
+    assert [key[0] for key in storage.report_cache.entries] == ['monthly', 'payroll']
+    assert build_monthly_report(storage, '1', '2024-05-01', '2024-05-31', 'مايو').rows[-1][0][3] == 8.0
+
+
+def test_report_built_during_punch_is_not_cached(storage):
+    def build():
+        check_in = to_timestamp(datetime(2024, 5, 10, 8))
+        storage.add_check_in('1', '2024-05-10', check_in)
+        return result()
+    
+    cached_report(storage, ('monthly', '1'), build, '1', 'المبيعات', '2024-05-01', '2024-05-31')
+    assert ('monthly', '1') not in storage.report_cache.entries
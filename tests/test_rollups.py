@@ -0,0 +1,70 @@
+from datetime import datetime
+
+import pytest
+
+from attendance_core import (
+    build_payroll_report, build_session_table, calculate_salary, compute_payroll, to_timestamp, verify_rollups,
+)
+
+pytest.importorskip('pandas')
+
+
+def work(storage, text, seconds):
+    """جلسة مغلقة للموظف 1 تبدأ في text ومدتها seconds ثانية"""
+    check_in = to_timestamp(datetime.strptime(text, '%Y-%m-%d %H:%M'))
+    session = storage.add_check_in('1', text[:10], check_in)
+    storage.close_session(session, check_in + seconds)
+
+
+def add_sessions(storage):
+    # مدد تقع ساعاتها على نصف المئة (8.005 و 1.015 و 0.125) حيث يختلف np.round عن round
+    work(storage, '2024-05-01 08:00', 8 * 3600 + 18)
+    work(storage, '2024-05-01 17:00', 3600 + 54)
+    work(storage, '2024-05-02 09:00', 450)
+    work(storage, '2024-05-31 09:00', 4 * 3600)
+    work(storage, '2024-06-03 08:30', 7 * 3600 + 18)
+
+
+def all_sessions(storage):
+    return storage.closed_sessions_between('2024-01-01', '2024-12-31')
+
+
+def test_session_table_hours_match_sessions(storage):
+    add_sessions(storage)
+    sessions = all_sessions(storage)
+    table = build_session_table(sessions)
+    assert table['hours'].tolist() == [session.hours for session in sessions]
+
+
+def test_payroll_report_matches_sessions(storage):
+    add_sessions(storage)
+    report = build_payroll_report(storage, '2024-05-01', '2024-06-30', '', 'مايو ويونيو')
+    per_employee, _ = compute_payroll(build_session_table(all_sessions(storage)), {'1': 100.0})
+    
+    _, _, _, days, hours, salary = report.rows[0][0]
+    assert (days, hours, salary) == tuple(per_employee.loc['1', ['days', 'hours', 'salary']])
+    assert verify_rollups(storage) == []
+
+
+
+def test_salary_rounds_half_cents_up(storage):
+    # 12.5 × 1.01 = 12.625 بالضبط، و round العادي يعطي 12.62 بسبب تمثيل الكسور
+    assert calculate_salary(12.5, 1.01) == 12.63
+    work(storage, '2024-05-01 08:00', 3600 + 36)
+    _, daily = compute_payroll(build_session_table(all_sessions(storage)), {'1': 12.5})
+    assert daily['salary'].tolist() == [12.63]
+
+
+def test_day_rollups_for_one_employee(storage):
+    add_sessions(storage)
+    storage.add_employee('2', {'name': 'سارة', 'department': 'المبيعات', 'monthly_salary': 5200})
+    check_in = to_timestamp(datetime(2024, 5, 15, 8))
+    storage.close_session(storage.add_check_in('2', '2024-05-15', check_in), check_in + 3600)
+    
+    days = storage.day_rollups('2024-05-01', '2024-06-30', '1')
+    assert [(emp_id, date) for emp_id, date, _, _, _ in days] == [
+        ('1', '2024-05-01'), ('1', '2024-05-02'), ('1', '2024-05-31'), ('1', '2024-06-03')]
+    assert days[0][2] == 9.02
+    
+    all_days = storage.day_rollups('2024-05-01', '2024-05-31')
+    assert [date for _, date, _, _, _ in all_days] == ['2024-05-01', '2024-05-02', '2024-05-15', '2024-05-31']
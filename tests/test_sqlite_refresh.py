@@ -0,0 +1,38 @@
+from unittest import mock
+
+from attendance_core import SqliteStorage
+
+
+def test_refresh_does_not_reload_without_changes(tmp_path):
+    storage = SqliteStorage(str(tmp_path / 'attendance.db'))
+    storage.load()
+    storage.add_employee('1', {'name': 'أحمد', 'department': '', 'monthly_salary': 2600})
+    
+    with mock.patch.object(storage, 'load', wraps=storage.load) as load:
+        storage.refresh()
+        storage.refresh()
+    assert load.call_count == 0
+    assert '1' in storage.employees
+    storage.close()
+
+
+def test_refresh_swaps_in_changes_from_other_connection(tmp_path):
+    path = str(tmp_path / 'attendance.db')
+    storage = SqliteStorage(path)
+    storage.load()
+    other = SqliteStorage(path)
+    other.load()
+    
+    old_employees = storage.employees
+    old_employees_copy = dict(old_employees)
+    other.add_employee('2', {'name': 'سارة', 'department': '', 'monthly_salary': 5200})
+    
+    with mock.patch.object(storage, 'load', wraps=storage.load) as load:
+        storage.refresh()
+        storage.refresh()
+    assert load.call_count == 1
+    assert storage.employees['2']['hourly_rate'] == 200.0
+    # القاموس القديم لا يتغير أثناء قراءته من الواجهة
+    assert old_employees == old_employees_copy
+    other.close()
+    storage.close()
@@ -1,12 +1,31 @@
+import sys
+import time
+
+# وضع قياس زمن بدء التشغيل: تشغيل البرنامج مع --startup-timing يطبع زمن الاستيراد وتحميل البيانات
+STARTUP_TIMING = '--startup-timing' in sys.argv
+startup_begin = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from datetime import datetime, timedelta
-import pandas as pd
-from fpdf import FPDF
+from datetime import datetime
 import os
-import json
-from collections import defaultdict
-from PIL import Image, ImageTk
+import threading
+from concurrent.futures import ThreadPoolExecutor
+# pandas و fpdf و openpyxl يتم استيرادها داخل attendance_core عند أول تقرير رواتب أو تصدير فقط
+from attendance_core import (
+    METRICS, STORAGE_BACKENDS, EmployeeDirectory, JobCancelled, StorageConflict, StorageFormatError,
+    build_daily_report, build_monthly_report, build_payroll_report, format_report_value, format_timestamp,
+    import_punch_file, is_archived, open_storage, to_timestamp, write_excel, write_pdf, write_rejected_punches,
+)
+
+imports_seconds = time.perf_counter() - startup_begin
+
+# ملف ملخص قياسات الأداء (يُكتب عند الإغلاق ومن تبويب الأداء)
+METRICS_PATH = os.path.join('data', 'metrics.json')
+
+# أقل مدة بين قراءتين لسجل البصمات أثناء كتابة كود الموظف
+EMPLOYEE_INFO_REFRESH_SECONDS = 1.0
+
 
 class EmployeeAttendanceSystem:
     def __init__(self, root):
@@ -18,67 +37,71 @@ class EmployeeAttendanceSystem:
         # كلمة السر للإدارة (يمكن تغييرها)
         self.admin_password = "a2cf1543"
         
-        # إنشاء مجلد البيانات إذا لم يكن موجوداً
-        if not os.path.exists('data'):
-            os.makedirs('data')
+        # نوع التخزين من متغير البيئة ATTENDANCE_BACKEND: 'json' (الافتراضي) أو 'sqlite' مثل --backend في سطر الأوامر
+        # (يتم نقل بيانات JSON تلقائياً عند أول تشغيل بـ sqlite)
+        self.storage_backend = os.environ.get('ATTENDANCE_BACKEND', 'json')
+        # مدة تجميع البصمات في fsync واحد لتخزين JSON من ATTENDANCE_COMMIT_WINDOW_MS مثل --commit-window-ms
+        self.commit_window_ms = os.environ.get('ATTENDANCE_COMMIT_WINDOW_MS', '0')
+        
+        # آخر قراءة لبصمات الأجهزة الأخرى أثناء كتابة كود الموظف
+        self.employee_info_refreshed = 0.0
         
         # تحميل البيانات
+        load_begin = time.perf_counter()
         self.load_data()
+        self.load_seconds = time.perf_counter() - load_begin
+        
+        # التقارير والتصدير تعمل في الخلفية حتى لا تتوقف البصمات أثناءها
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.background_job = None
         
         # إنشاء واجهة المستخدم
         self.create_login_page()
+        self.root.protocol('WM_DELETE_WINDOW', self.on_close)
+        
+        if STARTUP_TIMING:
+            self.root.after_idle(self.report_startup_timing)
+    
+    def report_startup_timing(self):
+        """طباعة زمن بدء التشغيل بعد ظهور صفحة الدخول"""
+        print(f"استيراد المكتبات: {imports_seconds:.3f} ثانية")
+        print(f"تحميل البيانات (load_data): {self.load_seconds:.3f} ثانية")
+        print(f"حتى ظهور صفحة الدخول: {time.perf_counter() - startup_begin:.3f} ثانية")
+    
+    def on_close(self):
+        """إغلاق البرنامج بعد حفظ ما تبقى من البيانات"""
+        self.cancel_background_job()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.storage.close()
+        if METRICS.enabled and METRICS.histograms:
+            METRICS.dump(METRICS_PATH)
+        self.root.destroy()
+    
+    @property
+    def employees(self):
+        """الموظفون من طبقة التخزين (قد تستبدل القاموس كله عند قراءة تعديلات الأجهزة الأخرى)"""
+        return self.storage.employees
     
     def load_data(self):
         """تحميل بيانات الموظفين وسجلات الحضور"""
+        if self.storage_backend not in STORAGE_BACKENDS:
+            message = (f"قيمة ATTENDANCE_BACKEND غير معروفة: {self.storage_backend}\n"
+                       f"القيم المتاحة: {'، '.join(STORAGE_BACKENDS)}")
+            messagebox.showerror("خطأ", message)
+            raise ValueError(message)
+        if not self.commit_window_ms.isdigit():
+            message = (f"قيمة ATTENDANCE_COMMIT_WINDOW_MS غير صالحة: {self.commit_window_ms}\n"
+                       "يجب أن تكون عدداً صحيحاً من الملّي ثانية")
+            messagebox.showerror("خطأ", message)
+            raise ValueError(message)
         try:
-            with open('data/employees.json', 'r', encoding='utf-8') as f:
-                self.employees = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            self.employees = {}
-        
-        try:
-            with open('data/attendance.json', 'r', encoding='utf-8') as f:
-                old_data = json.load(f)
-                self.attendance = self.convert_old_data(old_data)
-        except (FileNotFoundError, json.JSONDecodeError):
-            self.attendance = defaultdict(lambda: defaultdict(list))
-    
-    def convert_old_data(self, old_data):
-        """تحويل البيانات القديمة إلى الهيكل الجديد"""
-        new_data = defaultdict(lambda: defaultdict(list))
-        for date, employees in old_data.items():
-            for emp_id, records in employees.items():
-                if isinstance(records, dict):
-                    if 'check_in' in records:
-                        new_data[date][emp_id].append({
-                            'check_in': records['check_in'],
-                            'check_out': records.get('check_out', '')
-                        })
-                elif isinstance(records, list):
-                    for record in records:
-                        if 'check_in' in record:
-                            new_data[date][emp_id].append({
-                                'check_in': record['check_in'],
-                                'check_out': record.get('check_out', '')
-                            })
-        return new_data
-    
-    def save_data(self):
-        """حفظ البيانات في الملفات"""
-        with open('data/employees.json', 'w', encoding='utf-8') as f:
-            json.dump(self.employees, f, indent=4, ensure_ascii=False)
-        
-        with open('data/attendance.json', 'w', encoding='utf-8') as f:
-            normal_dict = {date: dict(employees) for date, employees in self.attendance.items()}
-            json.dump(normal_dict, f, indent=4, ensure_ascii=False)
-    
-    def calculate_hourly_rate(self, monthly_salary):
-        """حساب سعر الساعة من سعر الساعه"""
-        return round(monthly_salary / 26, 2)
-    
-    def calculate_salary(self, hourly_rate, hours):
-        """حساب الراتب من سعر الساعة وعدد الساعات"""
-        return round(hourly_rate * hours, 2)
+            self.storage = open_storage(self.storage_backend, 'data', int(self.commit_window_ms))
+        except StorageFormatError as e:
+            # لا نبدأ ببيانات فارغة فوق ملفات لا نفهمها
+            messagebox.showerror("خطأ", str(e))
+            raise
+        # فهرس البحث في قائمة الموظفين (يُحدّث من self.employees عند تحديث القائمة)
+        self.directory = EmployeeDirectory()
     
     def create_login_page(self):
         """إنشاء صفحة تسجيل الدخول"""
@@ -141,12 +164,10 @@ class EmployeeAttendanceSystem:
     
     def has_open_checkin(self, emp_id):
         """التحقق من وجود حضور مفتوح (بدون انصراف) للموظف في أي يوم"""
-        for date in self.attendance:
-            if emp_id in self.attendance[date]:
-                for record in self.attendance[date][emp_id]:
-                    if record.get('check_in') and not record.get('check_out'):
-                        return True, date
-        return False, None
+        session = self.storage.find_open_session(emp_id)
+        if session is None:
+            return False, None
+        return True, session.date
     
     def create_attendance_ui(self):
         """إنشاء واجهة الموظف (الحضور والانصراف)"""
@@ -237,8 +258,26 @@ class EmployeeAttendanceSystem:
         self.reports_tab = ttk.Frame(self.notebook)
         self.notebook.add(self.reports_tab, text='التقارير')
         
+        self.metrics_tab = ttk.Frame(self.notebook)
+        self.notebook.add(self.metrics_tab, text='الأداء')
+        
         self.create_management_tab()
         self.create_reports_tab()
+        self.create_metrics_tab()
+        
+        # حالة العملية الجارية ظاهرة تحت كل التبويبات (الاستيراد يبدأ من الإدارة والتصدير من التقارير)
+        job_frame = ttk.Frame(self.root)
+        job_frame.pack(fill='x', padx=10)
+        
+        self.job_cancel_btn = ttk.Button(job_frame, text="إلغاء", command=self.cancel_background_job,
+                                         state='disabled')
+        self.job_cancel_btn.pack(side='left', padx=5)
+        
+        self.job_progress = ttk.Progressbar(job_frame, mode='indeterminate', length=150)
+        self.job_progress.pack(side='left', padx=5)
+        
+        self.job_label = ttk.Label(job_frame, text="", font=('Arial', 10))
+        self.job_label.pack(side='left', padx=5)
         
         back_btn = ttk.Button(self.root, text="العودة", command=self.create_login_page,
                             style='Accent.TButton')
@@ -269,10 +308,35 @@ class EmployeeAttendanceSystem:
                             style='Accent.TButton')
         add_btn.grid(row=4, column=0, columnspan=2, pady=15, ipadx=10, ipady=5)
         
+        import_frame = ttk.LabelFrame(self.management_tab, text="استيراد بصمات من جهاز البصمة", padding=(20, 10))
+        import_frame.pack(fill='x', padx=20, pady=5)
+        
+        import_btn = ttk.Button(import_frame, text="استيراد ملف بصمات (CSV أو سجل الجهاز)",
+                                command=self.import_punches, style='Accent.TButton')
+        import_btn.pack(side='right', padx=5, ipadx=10, ipady=5)
+        
         emp_list_frame = ttk.LabelFrame(self.management_tab, text="قائمة الموظفين", padding=(15, 10))
         emp_list_frame.pack(fill='both', expand=True, padx=20, pady=10)
         
-        columns = ('emp_id', 'emp_name', 'department', 'monthly_salary', 'hourly_rate')
+        search_frame = ttk.Frame(emp_list_frame)
+        search_frame.pack(fill='x', pady=5)
+        
+        ttk.Label(search_frame, text="بحث بالكود أو الاسم:", font=('Arial', 12)).pack(side='right', padx=5)
+        self.emp_search = tk.StringVar()
+        self.emp_search.trace_add('write', lambda *args: self.update_employees_list())
+        ttk.Entry(search_frame, textvariable=self.emp_search, width=20, font=('Arial', 12)).pack(side='right', padx=5)
+        
+        ttk.Label(search_frame, text="القسم:", font=('Arial', 12)).pack(side='right', padx=5)
+        self.emp_dept_filter = ttk.Combobox(search_frame, width=15, font=('Arial', 12), values=['الكل'],
+                                            state='readonly')
+        self.emp_dept_filter.current(0)
+        self.emp_dept_filter.bind('<<ComboboxSelected>>', lambda event: self.update_employees_list())
+        self.emp_dept_filter.pack(side='right', padx=5)
+        
+        self.emp_count_label = ttk.Label(search_frame, text="", font=('Arial', 10))
+        self.emp_count_label.pack(side='left', padx=5)
+        
+        columns = ('emp_id', 'emp_name', 'department', 'monthly_salary', 'hourly_rate', 'status')
         self.emp_tree = ttk.Treeview(emp_list_frame, columns=columns, show='headings', height=10)
         
         self.emp_tree.heading('emp_id', text='كود الموظف')
@@ -280,12 +344,17 @@ class EmployeeAttendanceSystem:
         self.emp_tree.heading('department', text='القسم')
         self.emp_tree.heading('monthly_salary', text='الراتب الشهري')
         self.emp_tree.heading('hourly_rate', text='سعر الساعه')
+        self.emp_tree.heading('status', text='الحالة')
         
         self.emp_tree.column('emp_id', width=100, anchor='center')
         self.emp_tree.column('emp_name', width=150, anchor='center')
         self.emp_tree.column('department', width=120, anchor='center')
         self.emp_tree.column('monthly_salary', width=120, anchor='center')
         self.emp_tree.column('hourly_rate', width=100, anchor='center')
+        self.emp_tree.column('status', width=140, anchor='center')
+        self.emp_tree.tag_configure('archived', foreground='gray')
+        # أكواد الموظفين المعروضين حالياً (معرّف كل صف في القائمة هو كود الموظف)
+        self.emp_rows = set()
         
         self.emp_tree.pack(fill='both', expand=True, padx=5, pady=5)
         
@@ -296,7 +365,11 @@ class EmployeeAttendanceSystem:
         del_btn_frame = ttk.Frame(emp_list_frame)
         del_btn_frame.pack(fill='x', pady=5)
         
-        del_btn = ttk.Button(del_btn_frame, text="حذف الموظف المحدد", command=self.delete_employee,
+        archive_btn = ttk.Button(del_btn_frame, text="أرشفة / إعادة تفعيل الموظف المحدد",
+                                 command=self.toggle_employee_archive, style='Accent.TButton')
+        archive_btn.pack(side='right', padx=5, ipadx=10, ipady=5)
+        
+        del_btn = ttk.Button(del_btn_frame, text="حذف الموظف المحدد نهائياً", command=self.delete_employee,
                            style='Accent.TButton')
         del_btn.pack(side='right', padx=5, ipadx=10, ipady=5)
         
@@ -313,6 +386,8 @@ class EmployeeAttendanceSystem:
                        value='daily', command=self.update_report_ui).pack(side='right', padx=15)
         ttk.Radiobutton(report_type_frame, text="تقرير شهري", variable=self.report_type, 
                        value='monthly', command=self.update_report_ui).pack(side='right', padx=15)
+        ttk.Radiobutton(report_type_frame, text="تقرير الرواتب", variable=self.report_type, 
+                       value='payroll', command=self.update_report_ui).pack(side='right', padx=15)
         
         self.report_criteria_frame = ttk.LabelFrame(self.reports_tab, text="معايير التقرير", padding=(20, 15))
         self.report_criteria_frame.pack(fill='x', padx=20, pady=10)
@@ -322,11 +397,31 @@ class EmployeeAttendanceSystem:
         
         self.report_tree = ttk.Treeview(report_result_frame)
         self.report_tree.pack(fill='both', expand=True, padx=5, pady=5)
+        self.report_tree.tag_configure('total', background='#e6f7ff', font=('Arial', 10, 'bold'))
         
         scrollbar = ttk.Scrollbar(report_result_frame, orient='vertical', command=self.report_tree.yview)
         scrollbar.pack(side='right', fill='y')
         self.report_tree.configure(yscrollcommand=scrollbar.set)
         
+        # صفوف التقرير كاملة في الذاكرة، والجدول يعرض صفحة واحدة منها فقط
+        self.report_result = None
+        self.report_rows = []
+        self.report_page = 0
+        self.report_page_size = 500
+        self.report_render_id = 0
+        
+        pager_frame = ttk.Frame(report_result_frame)
+        pager_frame.pack(fill='x', pady=5)
+        
+        self.report_next_btn = ttk.Button(pager_frame, text="التالي", command=lambda: self.show_report_page(self.report_page + 1))
+        self.report_next_btn.pack(side='left', padx=5)
+        
+        self.report_page_label = ttk.Label(pager_frame, text="", font=('Arial', 10))
+        self.report_page_label.pack(side='left', padx=10)
+        
+        self.report_prev_btn = ttk.Button(pager_frame, text="السابق", command=lambda: self.show_report_page(self.report_page - 1))
+        self.report_prev_btn.pack(side='left', padx=5)
+        
         export_frame = ttk.Frame(report_result_frame)
         export_frame.pack(fill='x', pady=5)
         
@@ -340,11 +435,80 @@ class EmployeeAttendanceSystem:
         
         self.update_report_ui()
     
+    def create_metrics_tab(self):
+        """إنشاء تبويب قياس الأداء (أزمنة البصمات والحفظ والبحث والتقارير والتصدير)"""
+        controls_frame = ttk.LabelFrame(self.metrics_tab, text="قياس الأداء", padding=(20, 15))
+        controls_frame.pack(fill='x', padx=20, pady=10)
+        
+        self.metrics_enabled = tk.BooleanVar(value=METRICS.enabled)
+        ttk.Checkbutton(controls_frame, text="تفعيل القياس", variable=self.metrics_enabled,
+                        command=self.toggle_metrics).pack(side='right', padx=15)
+        
+        refresh_btn = ttk.Button(controls_frame, text="تحديث", command=self.update_metrics_list,
+                                 style='Accent.TButton')
+        refresh_btn.pack(side='right', padx=5, ipadx=10, ipady=5)
+        
+        reset_btn = ttk.Button(controls_frame, text="تصفير القياسات", command=self.reset_metrics,
+                               style='Accent.TButton')
+        reset_btn.pack(side='right', padx=5, ipadx=10, ipady=5)
+        
+        dump_btn = ttk.Button(controls_frame, text="حفظ في ملف", command=self.dump_metrics,
+                              style='Accent.TButton')
+        dump_btn.pack(side='right', padx=5, ipadx=10, ipady=5)
+        
+        metrics_frame = ttk.LabelFrame(self.metrics_tab, text="أزمنة العمليات (ميلي ثانية)", padding=(15, 10))
+        metrics_frame.pack(fill='both', expand=True, padx=20, pady=10)
+        
+        columns = ('name', 'count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms')
+        self.metrics_tree = ttk.Treeview(metrics_frame, columns=columns, show='headings', height=15)
+        
+        headings = ('العملية', 'العدد', 'المتوسط', 'p50', 'p95', 'p99', 'الأقصى')
+        for column, heading in zip(columns, headings):
+            self.metrics_tree.heading(column, text=heading)
+            self.metrics_tree.column(column, width=220 if column == 'name' else 90, anchor='center')
+        
+        self.metrics_tree.pack(fill='both', expand=True, padx=5, pady=5)
+        
+        scrollbar = ttk.Scrollbar(metrics_frame, orient='vertical', command=self.metrics_tree.yview)
+        scrollbar.pack(side='right', fill='y')
+        self.metrics_tree.configure(yscrollcommand=scrollbar.set)
+        
+        self.update_metrics_list()
+    
+    def update_metrics_list(self):
+        """عرض ملخص القياسات الحالية"""
+        self.metrics_tree.delete(*self.metrics_tree.get_children())
+        for name, summary in METRICS.summary().items():
+            self.metrics_tree.insert('', 'end', values=(
+                name, summary['count'], summary['mean_ms'], summary['p50_ms'],
+                summary['p95_ms'], summary['p99_ms'], summary['max_ms']))
+    
+    def toggle_metrics(self):
+        """تشغيل أو إيقاف القياس"""
+        METRICS.enabled = self.metrics_enabled.get()
+    
+    def reset_metrics(self):
+        """حذف القياسات السابقة"""
+        METRICS.reset()
+        self.update_metrics_list()
+    
+    def dump_metrics(self):
+        """حفظ ملخص القياسات في ملف"""
+        try:
+            METRICS.dump(METRICS_PATH)
+        except OSError as e:
+            messagebox.showerror("خطأ", f"تعذر حفظ القياسات: {e}")
+            return
+        messagebox.showinfo("تم", f"تم حفظ القياسات في {METRICS_PATH}")
+    
     def update_report_ui(self):
         """تحديث واجهة التقارير بناءً على نوع التقرير المحدد"""
         for widget in self.report_criteria_frame.winfo_children():
             widget.destroy()
         
+        # أعمدة التقرير ستتغير فلا معنى لصفوف التقرير السابق
+        self.show_report(None)
+        
         if self.report_type.get() == 'daily':
             ttk.Label(self.report_criteria_frame, text="تاريخ التقرير:", font=('Arial', 12)).pack(side='right', padx=10)
             
@@ -370,6 +534,46 @@ class EmployeeAttendanceSystem:
             for col in self.report_tree['columns']:
                 self.report_tree.column(col, width=100, anchor='center')
         
+        elif self.report_type.get() == 'payroll':
+            date_frame = ttk.Frame(self.report_criteria_frame)
+            date_frame.pack(side='right', padx=10)
+            
+            ttk.Label(date_frame, text="من تاريخ:", font=('Arial', 10)).grid(row=0, column=0, padx=5)
+            self.start_date = ttk.Entry(date_frame, width=12, font=('Arial', 10))
+            self.start_date.insert(0, datetime.now().replace(day=1).strftime('%Y-%m-%d'))
+            self.start_date.grid(row=0, column=1, padx=5)
+            
+            ttk.Label(date_frame, text="إلى تاريخ:", font=('Arial', 10)).grid(row=1, column=0, padx=5)
+            self.end_date = ttk.Entry(date_frame, width=12, font=('Arial', 10))
+            self.end_date.insert(0, datetime.now().strftime('%Y-%m-%d'))
+            self.end_date.grid(row=1, column=1, padx=5)
+            
+            ttk.Label(self.report_criteria_frame, text="القسم:", font=('Arial', 12)).pack(side='right', padx=10)
+            
+            departments = sorted({emp_data.get('department', '') for emp_data in self.employees.values()} - {''})
+            self.payroll_dept = ttk.Combobox(self.report_criteria_frame, width=15, font=('Arial', 12),
+                                             values=['الكل'] + departments, state='readonly')
+            self.payroll_dept.current(0)
+            self.payroll_dept.pack(side='right', padx=10)
+            
+            ttk.Button(self.report_criteria_frame, text="عرض التقرير", command=self.generate_payroll_report,
+                     style='Accent.TButton').pack(side='right', padx=10, ipadx=10, ipady=5)
+            
+            self.report_tree['columns'] = ('emp_id', 'emp_name', 'department', 'days', 'hours', 'salary')
+            
+            for col in self.report_tree['columns']:
+                self.report_tree.heading(col, text='')
+            
+            self.report_tree.heading('emp_id', text='كود الموظف')
+            self.report_tree.heading('emp_name', text='اسم الموظف')
+            self.report_tree.heading('department', text='القسم')
+            self.report_tree.heading('days', text='أيام الحضور')
+            self.report_tree.heading('hours', text='عدد الساعات')
+            self.report_tree.heading('salary', text='الراتب')
+            
+            for col in self.report_tree['columns']:
+                self.report_tree.column(col, width=110, anchor='center')
+        
         else:
             date_frame = ttk.Frame(self.report_criteria_frame)
             date_frame.pack(side='right', padx=10)
@@ -406,62 +610,137 @@ class EmployeeAttendanceSystem:
             for col in self.report_tree['columns']:
                 self.report_tree.column(col, width=120, anchor='center')
     
+    @METRICS.timed('ui.employees_list')
     def update_employees_list(self):
-        """تحديث قائمة الموظفين"""
-        for item in self.emp_tree.get_children():
-            self.emp_tree.delete(item)
-        
-        for emp_id, emp_data in self.employees.items():
-            monthly_salary = emp_data.get('monthly_salary', 0)
-            hourly_rate = self.calculate_hourly_rate(monthly_salary) if monthly_salary else 0
-            
-            self.emp_tree.insert('', 'end', values=(
-                emp_id, 
-                emp_data['name'], 
+        """تحديث قائمة الموظفين حسب البحث والقسم: إضافة وحذف وتعديل الصفوف التي تغيرت فقط"""
+        _, _, changed = self.directory.sync(self.employees)
+        department = self.emp_dept_filter.get()
+        visible = self.directory.search(self.emp_search.get(), '' if department == 'الكل' else department)
+        visible_rows = set(visible)
+        
+        hidden = [emp_id for emp_id in self.emp_rows if emp_id not in visible_rows]
+        if hidden:
+            self.emp_tree.delete(*hidden)
+        for emp_id in changed:
+            if emp_id in self.emp_rows and emp_id in visible_rows:
+                self.emp_tree.item(emp_id, **self.employee_row(emp_id))
+        # الصفوف المعروضة بنفس ترتيب النتائج، فكل صف جديد يُدرج في موضعه منها
+        for index, emp_id in enumerate(visible):
+            if emp_id not in self.emp_rows:
+                self.emp_tree.insert('', index, iid=emp_id, **self.employee_row(emp_id))
+        self.emp_rows = visible_rows
+        
+        self.emp_dept_filter['values'] = ['الكل'] + self.directory.department_names()
+        self.emp_count_label.config(text=f"{len(visible)} من {len(self.employees)} موظف")
+    
+    def employee_row(self, emp_id):
+        """قيم صف الموظف في القائمة، والموظف المؤرشف يظهر بلون مختلف"""
+        emp_data = self.employees[emp_id]
+        archived = is_archived(emp_data)
+        return {
+            'values': (
+                emp_id,
+                emp_data['name'],
                 emp_data.get('department', ''),
-                monthly_salary,
-                hourly_rate
-            ))
+                emp_data.get('monthly_salary', 0),
+                emp_data['hourly_rate'],
+                f"مؤرشف منذ {emp_data['archived_on']}" if archived else "نشط"
+            ),
+            'tags': ('archived',) if archived else ()
+        }
     
+    @METRICS.timed('ui.daily_attendance')
     def update_daily_attendance(self):
-        """تحديث سجل الحضور اليومي"""
+        """تحديث سجل الحضور اليومي بالكامل (عند فتح الواجهة أو بداية يوم جديد)"""
+        self.storage.refresh()
         for item in self.daily_tree.get_children():
             self.daily_tree.delete(item)
         
         today = datetime.now().strftime('%Y-%m-%d')
-        
-        if today in self.attendance:
-            for emp_id, records in self.attendance[today].items():
-                if emp_id in self.employees:
-                    emp_name = self.employees[emp_id]['name']
-                    total_hours = 0
-                    
-                    for i, record in enumerate(records, 1):
-                        check_in = record.get('check_in', '')
-                        check_out = record.get('check_out', '')
-                        
-                        hours = ''
-                        if check_in and check_out:
-                            try:
-                                time_in = datetime.strptime(check_in, '%Y-%m-%d %H:%M:%S')
-                                time_out = datetime.strptime(check_out, '%Y-%m-%d %H:%M:%S')
-                                delta = time_out - time_in
-                                hours = round(delta.total_seconds() / 3600, 2)
-                                total_hours += hours
-                            except ValueError:
-                                hours = ''
-                        
-                        self.daily_tree.insert('', 'end', 
-                            values=(f"{emp_id} ({i})", emp_name, check_in, check_out, hours))
+        self.daily_date = today
+        # ربط كل جلسة وكل صف إجمالي بعنصره في الجدول للتحديث الجزئي بعد كل بصمة
+        self.daily_items = {}
+        self.daily_total_items = {}
+        self.daily_tree.tag_configure('total', background='#e6f7ff', font=('Arial', 10, 'bold'))
+        
+        for emp_id, sessions in self.storage.sessions_on(today).items():
+            if emp_id in self.employees:
+                emp_name = self.employees[emp_id]['name']
+                total_hours = 0
+                
+                for i, session in enumerate(sessions, 1):
+                    if not session.is_open:
+                        total_hours += session.hours
                     
-                    if total_hours > 0:
-                        self.daily_tree.insert('', 'end', 
-                            values=(f"{emp_id} (الإجمالي)", emp_name, "", "", total_hours),
-                            tags=('total',))
-                        self.daily_tree.tag_configure('total', background='#e6f7ff', font=('Arial', 10, 'bold'))
+                    self.daily_items[(emp_id, session.check_in)] = self.daily_tree.insert('', 'end', 
+                        values=self.daily_row_values(emp_id, emp_name, i, session))
+                
+                if total_hours > 0:
+                    self.daily_total_items[emp_id] = self.daily_tree.insert('', 'end', 
+                        values=(f"{emp_id} (الإجمالي)", emp_name, "", "", total_hours),
+                        tags=('total',))
+    
+    def daily_row_values(self, emp_id, emp_name, index, session):
+        """قيم صف جلسة في سجل الحضور اليومي"""
+        hours = '' if session.is_open else session.hours
+        return (f"{emp_id} ({index})", emp_name, format_timestamp(session.check_in),
+                format_timestamp(session.check_out), hours)
     
+    @METRICS.timed('ui.daily_row')
+    def refresh_daily_row(self, session):
+        """تحديث صف الجلسة وصف إجمالي الموظف فقط في سجل الحضور اليومي"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        if today != self.daily_date:
+            self.update_daily_attendance()
+            return
+        
+        emp_id = session.emp_id
+        if session.date != today or emp_id not in self.employees:
+            return
+        
+        emp_name = self.employees[emp_id]['name']
+        day_sessions = self.storage.sessions_between(emp_id, today, today)
+        sessions = day_sessions[0][1] if day_sessions else []
+        
+        total_hours = 0
+        last_item = None
+        for i, day_session in enumerate(sessions, 1):
+            if not day_session.is_open:
+                total_hours += day_session.hours
+            
+            key = (emp_id, day_session.check_in)
+            item = self.daily_items.get(key)
+            if day_session.check_in == session.check_in:
+                values = self.daily_row_values(emp_id, emp_name, i, day_session)
+                if item is None:
+                    # الجلسة الجديدة توضع بعد آخر صف للموظف وإلا في نهاية الجدول
+                    position = self.daily_tree.index(last_item) + 1 if last_item else 'end'
+                    item = self.daily_tree.insert('', position, values=values)
+                    self.daily_items[key] = item
+                else:
+                    self.daily_tree.item(item, values=values)
+            if item is not None:
+                last_item = item
+        
+        total_item = self.daily_total_items.get(emp_id)
+        if total_hours > 0:
+            values = (f"{emp_id} (الإجمالي)", emp_name, "", "", total_hours)
+            position = self.daily_tree.index(last_item) + 1
+            if total_item is None:
+                self.daily_total_items[emp_id] = self.daily_tree.insert('', position, values=values, tags=('total',))
+            else:
+                self.daily_tree.item(total_item, values=values)
+                self.daily_tree.move(total_item, '', position)
+    
+    @METRICS.timed('ui.employee_info')
     def update_employee_info(self, event=None):
         """تحديث معلومات الموظف عند إدخال الكود"""
+        # بصمات الأجهزة الأخرى التي تستخدم نفس مجلد البيانات: قراءة بدون قفل الملف ومرة كل ثانية
+        # على الأكثر أثناء الكتابة (تسجيل البصمة نفسه يأخذ القفل ويقرأ أحدث البيانات قبل الكتابة)
+        now = time.monotonic()
+        if now - self.employee_info_refreshed >= EMPLOYEE_INFO_REFRESH_SECONDS:
+            self.employee_info_refreshed = now
+            self.storage.refresh(locked=False)
         emp_id = self.emp_id_entry.get()
         if emp_id in self.employees:
             self.emp_name_label.config(text=self.employees[emp_id]['name'])
@@ -474,6 +753,11 @@ class EmployeeAttendanceSystem:
                     self.emp_status_label.config(text=f"متحضر من {open_date}", foreground='orange')
                 self.check_in_btn.config(state='disabled')
                 self.check_out_btn.config(state='normal')
+            elif is_archived(self.employees[emp_id]):
+                # الموظف المؤرشف يمكنه فقط إغلاق جلسة مفتوحة قبل أرشفته
+                self.emp_status_label.config(text="مؤرشف", foreground='red')
+                self.check_in_btn.config(state='disabled')
+                self.check_out_btn.config(state='disabled')
             else:
                 self.emp_status_label.config(text="منصرف", foreground='blue')
                 self.check_in_btn.config(state='normal')
@@ -496,22 +780,25 @@ class EmployeeAttendanceSystem:
             messagebox.showerror("خطأ", "كود الموظف غير مسجل")
             return
         
+        if is_archived(self.employees[emp_id]):
+            messagebox.showerror("خطأ", "الموظف مؤرشف ولا يمكن تسجيل حضوره")
+            return
+        
         has_open, open_date = self.has_open_checkin(emp_id)
         if has_open:
             messagebox.showerror("خطأ", f"الموظف متحضر بالفعل من تاريخ {open_date}\nيجب تسجيل الانصراف أولاً")
             return
         
-        today = datetime.now().strftime('%Y-%m-%d')
-        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        self.attendance[today][emp_id].append({
-            'check_in': now,
-            'check_out': ''
-        })
-        
-        self.save_data()
+        now = datetime.now()
+        try:
+            session = self.storage.add_check_in(emp_id, now.strftime('%Y-%m-%d'), to_timestamp(now))
+        except StorageConflict as e:
+            # سجل جهاز آخر حضور نفس الموظف قبل لحظات
+            messagebox.showerror("خطأ", str(e))
+            self.update_employee_info()
+            return
         messagebox.showinfo("تم", "تم تسجيل الحضور بنجاح")
-        self.update_daily_attendance()
+        self.refresh_daily_row(session)
         self.update_employee_info()
     
     def check_out(self):
@@ -526,33 +813,26 @@ class EmployeeAttendanceSystem:
             messagebox.showerror("خطأ", "كود الموظف غير مسجل")
             return
         
-        found_record = None
-        found_date = None
-        
-        for date in sorted(self.attendance.keys(), reverse=True):
-            if emp_id in self.attendance[date]:
-                for record in reversed(self.attendance[date][emp_id]):
-                    if record['check_in'] and not record['check_out']:
-                        found_record = record
-                        found_date = date
-                        break
-                if found_record:
-                    break
+        open_session = self.storage.find_open_session(emp_id)
         
-        if not found_record:
+        if open_session is None:
             messagebox.showerror("خطأ", "لا يوجد حضور مسجل يحتاج إلى انصراف")
             return
         
-        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        found_record['check_out'] = now
-        self.save_data()
+        now = datetime.now()
+        try:
+            session = self.storage.close_session(open_session, to_timestamp(now))
+        except StorageConflict as e:
+            messagebox.showerror("خطأ", str(e))
+            self.update_employee_info()
+            return
         
-        if found_date != datetime.now().strftime('%Y-%m-%d'):
-            messagebox.showinfo("تم", f"تم تسجيل الانصراف بنجاح\nتم إغلاق جلسة الحضور من تاريخ {found_date}")
+        if open_session.date != now.strftime('%Y-%m-%d'):
+            messagebox.showinfo("تم", f"تم تسجيل الانصراف بنجاح\nتم إغلاق جلسة الحضور من تاريخ {open_session.date}")
         else:
             messagebox.showinfo("تم", "تم تسجيل الانصراف بنجاح")
-            
-        self.update_daily_attendance()
+        
+        self.refresh_daily_row(session)
         self.update_employee_info()
     
     def add_employee(self):
@@ -576,13 +856,15 @@ class EmployeeAttendanceSystem:
             messagebox.showerror("خطأ", "الراتب يجب أن يكون رقماً")
             return
         
-        self.employees[emp_id] = {
-            'name': emp_name,
-            'department': emp_dept,
-            'monthly_salary': monthly_salary
-        }
-        
-        self.save_data()
+        try:
+            self.storage.add_employee(emp_id, {
+                'name': emp_name,
+                'department': emp_dept,
+                'monthly_salary': monthly_salary
+            })
+        except StorageConflict as e:
+            messagebox.showerror("خطأ", str(e))
+            return
         
         messagebox.showinfo("تم", "تم إضافة الموظف بنجاح")
         
@@ -593,33 +875,170 @@ class EmployeeAttendanceSystem:
         
         self.update_employees_list()
     
-    def delete_employee(self):
-        """حذف موظف"""
+    def import_punches(self):
+        """استيراد ملف بصمات في الخلفية وحفظ الصفوف المرفوضة بجانبه"""
+        file_path = filedialog.askopenfilename(
+            filetypes=[("Punch Logs", "*.csv *.dat *.txt"), ("All Files", "*.*")],
+            title="اختيار ملف البصمات"
+        )
+        
+        if not file_path:
+            return
+        
+        def on_done(result):
+            imported, rejected = result
+            message = f"تم تسجيل {imported} حدث حضور وانصراف"
+            if rejected:
+                rejected_path = os.path.splitext(file_path)[0] + '_rejected.csv'
+                write_rejected_punches(rejected_path, rejected)
+                message += f"\nتم رفض {len(rejected)} سطر، وتفاصيلها في {rejected_path}"
+            messagebox.showinfo("تم", message)
+            # ربما انتقل المستخدم إلى شاشة أخرى أثناء الاستيراد
+            if hasattr(self, 'daily_tree') and self.daily_tree.winfo_exists():
+                self.update_daily_attendance()
+            if self.emp_tree.winfo_exists():
+                self.update_employees_list()
+        
+        self.run_in_background(
+            "جاري استيراد البصمات...",
+            lambda cancel: import_punch_file(self.storage, file_path, cancel),
+            on_done,
+            needs_report_view=False)
+    
+    def toggle_employee_archive(self):
+        """أرشفة الموظف المحدد (يتوقف عن التسجيل وتبقى سجلاته في التقارير) أو إعادة تفعيله"""
         selected_item = self.emp_tree.selection()
         
         if not selected_item:
-            messagebox.showerror("خطأ", "يرجى اختيار موظف للحذف")
+            messagebox.showerror("خطأ", "يرجى اختيار موظف")
             return
         
-        emp_id = self.emp_tree.item(selected_item)['values'][0]
+        emp_id = selected_item[0]
+        archived = emp_id in self.employees and is_archived(self.employees[emp_id])
         
-        if not messagebox.askyesno("تأكيد", f"هل أنت متأكد من حذف الموظف {emp_id}؟"):
+        try:
+            self.storage.archive_employee(emp_id, not archived)
+        except StorageConflict as e:
+            messagebox.showerror("خطأ", str(e))
             return
         
-        del self.employees[emp_id]
+        messagebox.showinfo("تم", "تم إعادة تفعيل الموظف" if archived else "تم أرشفة الموظف")
+        self.update_employees_list()
+    
+    def delete_employee(self):
+        """حذف موظف نهائياً مع كل سجلات حضوره"""
+        selected_item = self.emp_tree.selection()
         
-        for date in list(self.attendance.keys()):
-            if emp_id in self.attendance[date]:
-                del self.attendance[date][emp_id]
-            
-            if not self.attendance[date]:
-                del self.attendance[date]
+        if not selected_item:
+            messagebox.showerror("خطأ", "يرجى اختيار موظف للحذف")
+            return
         
-        self.save_data()
+        # معرّف الصف هو كود الموظف (القيم المعروضة تتحول فيها الأكواد الرقمية إلى أرقام)
+        emp_id = selected_item[0]
+        
+        if not messagebox.askyesno(
+                "تأكيد", f"سيتم حذف الموظف {emp_id} وكل سجلات حضوره ورواتبه نهائياً.\n"
+                         "لإيقاف الموظف مع الاحتفاظ بسجلاته استخدم الأرشفة.\nهل أنت متأكد؟"):
+            return
+        
+        self.storage.remove_employee(emp_id)
         
         messagebox.showinfo("تم", "تم حذف الموظف بنجاح")
         self.update_employees_list()
     
+    def show_report(self, result):
+        """عرض نتيجة تقرير جديد بدءاً من الصفحة الأولى (None لتفريغ الجدول)"""
+        self.report_result = result
+        self.report_rows = result.rows if result is not None else []
+        self.show_report_page(0)
+    
+    @METRICS.timed('ui.report_page')
+    def show_report_page(self, page):
+        """عرض صفحة من صفوف التقرير وإضافة صفوفها على دفعات حتى لا تتجمد الواجهة"""
+        page_count = max(1, -(-len(self.report_rows) // self.report_page_size))
+        page = min(max(page, 0), page_count - 1)
+        self.report_page = page
+        
+        # أي دفعات متبقية من عرض سابق يتم تجاهلها
+        self.report_render_id += 1
+        self.report_tree.delete(*self.report_tree.get_children())
+        
+        start = page * self.report_page_size
+        end = min(start + self.report_page_size, len(self.report_rows))
+        self.insert_report_chunk(self.report_render_id, start, end)
+        
+        self.report_page_label.config(
+            text=f"صفحة {page + 1} من {page_count} ({len(self.report_rows)} صف)")
+        self.report_prev_btn.config(state='normal' if page > 0 else 'disabled')
+        self.report_next_btn.config(state='normal' if page < page_count - 1 else 'disabled')
+    
+    @METRICS.timed('ui.report_chunk')
+    def insert_report_chunk(self, render_id, start, end, chunk_size=100):
+        """إضافة دفعة من صفوف الصفحة ثم جدولة الدفعة التالية عند فراغ الواجهة"""
+        if render_id != self.report_render_id:
+            return
+        
+        chunk_end = min(start + chunk_size, end)
+        for values, tags in self.report_rows[start:chunk_end]:
+            self.report_tree.insert('', 'end', values=[format_report_value(value) for value in values], tags=tags)
+        
+        if chunk_end < end:
+            self.root.after_idle(self.insert_report_chunk, render_id, chunk_end, end, chunk_size)
+    
+    def run_in_background(self, description, task, on_done, needs_report_view=True):
+        """تشغيل عملية ثقيلة (تقرير أو تصدير) في الخلفية حتى تبقى الواجهة والبصمات سريعة
+        
+        task تستقبل حدث الإلغاء وتعيد النتيجة، وon_done تُستدعى بالنتيجة في خيط الواجهة.
+        needs_report_view=False تعني أن on_done لا تحتاج تبويب التقارير (مثل رسالة انتهاء التصدير).
+        """
+        if self.background_job is not None:
+            messagebox.showerror("خطأ", "توجد عملية قيد التنفيذ، انتظر انتهاءها أو قم بإلغائها")
+            return
+        
+        cancel_event = threading.Event()
+        future = self.executor.submit(task, cancel_event)
+        self.background_job = (future, cancel_event)
+        
+        self.job_label.config(text=description)
+        self.job_progress.start(10)
+        self.job_cancel_btn.config(state='normal')
+        self.root.after(100, self.poll_background_job, future, on_done, needs_report_view)
+    
+    def poll_background_job(self, future, on_done, needs_report_view):
+        """متابعة العملية الجارية في الخلفية وتسليم نتيجتها للواجهة عند انتهائها"""
+        if not future.done():
+            self.root.after(100, self.poll_background_job, future, on_done, needs_report_view)
+            return
+        
+        self.background_job = None
+        
+        # ربما خرج المستخدم من واجهة المدير أثناء تنفيذ العملية
+        admin_view = self.job_label.winfo_exists()
+        report_view = admin_view and self.report_tree.winfo_exists()
+        if admin_view:
+            self.job_progress.stop()
+            self.job_cancel_btn.config(state='disabled')
+            self.job_label.config(text="")
+        
+        if future.cancelled() or isinstance(future.exception(), JobCancelled):
+            if admin_view:
+                self.job_label.config(text="تم إلغاء العملية")
+            return
+        
+        if future.exception() is not None:
+            messagebox.showerror("خطأ", f"حدث خطأ أثناء التنفيذ: {future.exception()}")
+            return
+        
+        if report_view or not needs_report_view:
+            on_done(future.result())
+    
+    def cancel_background_job(self):
+        """إلغاء العملية الجارية في الخلفية"""
+        if self.background_job is not None:
+            future, cancel_event = self.background_job
+            cancel_event.set()
+            future.cancel()
+    
     def generate_daily_report(self):
         """توليد التقرير اليومي"""
         report_date = self.report_date.get()
@@ -630,46 +1049,13 @@ class EmployeeAttendanceSystem:
             messagebox.showerror("خطأ", "صيغة التاريخ غير صحيحة. استخدم YYYY-MM-DD")
             return
         
-        for item in self.report_tree.get_children():
-            self.report_tree.delete(item)
+        def on_done(result):
+            self.show_report(result)
+            if not result.rows:
+                messagebox.showinfo("معلومة", "لا توجد بيانات للتاريخ المحدد")
         
-        if report_date in self.attendance:
-            for emp_id, records in self.attendance[report_date].items():
-                if emp_id in self.employees:
-                    emp_name = self.employees[emp_id]['name']
-                    monthly_salary = self.employees[emp_id].get('monthly_salary', 0)
-                    hourly_rate = self.calculate_hourly_rate(monthly_salary) if monthly_salary else 0
-                    total_hours = 0
-                    
-                    for i, record in enumerate(records, 1):
-                        check_in = record.get('check_in', '')
-                        check_out = record.get('check_out', '')
-                        
-                        hours = ''
-                        salary = ''
-                        if check_in and check_out:
-                            try:
-                                time_in = datetime.strptime(check_in, '%Y-%m-%d %H:%M:%S')
-                                time_out = datetime.strptime(check_out, '%Y-%m-%d %H:%M:%S')
-                                delta = time_out - time_in
-                                hours = round(delta.total_seconds() / 3600, 2)
-                                total_hours += hours
-                                salary = self.calculate_salary(hourly_rate, hours)
-                            except ValueError:
-                                hours = ''
-                                salary = ''
-                        
-                        self.report_tree.insert('', 'end', 
-                            values=(f"{emp_id} ({i})", emp_name, check_in, check_out, hours, salary))
-                    
-                    if total_hours > 0:
-                        total_salary = self.calculate_salary(hourly_rate, total_hours)
-                        self.report_tree.insert('', 'end', 
-                            values=(f"{emp_id} (الإجمالي)", emp_name, "", "", total_hours, total_salary),
-                            tags=('total',))
-                        self.report_tree.tag_configure('total', background='#e6f7ff', font=('Arial', 10, 'bold'))
-        else:
-            messagebox.showinfo("معلومة", "لا توجد بيانات للتاريخ المحدد")
+        self.run_in_background("جاري إعداد التقرير اليومي...",
+                               lambda cancel: build_daily_report(self.storage, report_date, cancel), on_done)
     
     def generate_monthly_report(self):
         """توليد التقرير الشهري مع فلتر التاريخ"""
@@ -692,72 +1078,58 @@ class EmployeeAttendanceSystem:
             if start_date > end_date:
                 messagebox.showerror("خطأ", "تاريخ البداية يجب أن يكون أقل من تاريخ النهاية")
                 return
-                
+        
         except ValueError:
             messagebox.showerror("خطأ", "صيغة التاريخ غير صحيحة. استخدم YYYY-MM-DD")
             return
         
-        for item in self.report_tree.get_children():
-            self.report_tree.delete(item)
-        
-        monthly_salary = self.employees[emp_id].get('monthly_salary', 0)
-        hourly_rate = self.calculate_hourly_rate(monthly_salary) if monthly_salary else 0
-        
-        total_period_hours = 0
-        total_period_salary = 0
-        daily_totals = defaultdict(float)
+        def on_done(result):
+            self.show_report(result)
+            if not result.rows:
+                messagebox.showinfo("معلومة", "لا توجد بيانات للفترة المحددة")
+        
+        self.run_in_background(
+            "جاري إعداد التقرير الشهري...",
+            lambda cancel: build_monthly_report(
+                self.storage, emp_id, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'),
+                f"{start_date_str} إلى {end_date_str}", cancel),
+            on_done)
+    
+    def generate_payroll_report(self):
+        """توليد تقرير الرواتب لكل الموظفين عن فترة مع فلتر القسم"""
+        start_date_str = self.start_date.get()
+        end_date_str = self.end_date.get()
+        department = self.payroll_dept.get()
+        if department == 'الكل':
+            department = ''
         
-        current_date = start_date
-        while current_date <= end_date:
-            date_str = current_date.strftime('%Y-%m-%d')
-            
-            if date_str in self.attendance and emp_id in self.attendance[date_str]:
-                day_total = 0
-                
-                for record in self.attendance[date_str][emp_id]:
-                    check_in = record.get('check_in', '')
-                    check_out = record.get('check_out', '')
-                    
-                    hours = 0
-                    if check_in and check_out:
-                        try:
-                            time_in = datetime.strptime(check_in, '%Y-%m-%d %H:%M:%S')
-                            time_out = datetime.strptime(check_out, '%Y-%m-%d %H:%M:%S')
-                            delta = time_out - time_in
-                            hours = round(delta.total_seconds() / 3600, 2)
-                            day_total += hours
-                        except ValueError:
-                            pass
-                
-                if day_total > 0:
-                    daily_totals[date_str] = day_total
-                    total_period_hours += day_total
-                    day_salary = self.calculate_salary(hourly_rate, day_total)
-                    total_period_salary += day_salary
-                    
-                    first_checkin = self.attendance[date_str][emp_id][0].get('check_in', '')
-                    last_checkout = ''
-                    for record in reversed(self.attendance[date_str][emp_id]):
-                        if record.get('check_out'):
-                            last_checkout = record.get('check_out', '')
-                            break
-                    
-                    self.report_tree.insert('', 'end', 
-                        values=(date_str, first_checkin, last_checkout, day_total, day_salary))
+        try:
+            start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
+            end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
             
-            current_date += timedelta(days=1)
+            if start_date > end_date:
+                messagebox.showerror("خطأ", "تاريخ البداية يجب أن يكون أقل من تاريخ النهاية")
+                return
         
-        if total_period_hours > 0:
-            self.report_tree.insert('', 'end', 
-                values=(f"الإجمالي ({start_date_str} إلى {end_date_str})", "", "", total_period_hours, total_period_salary),
-                tags=('total',))
-            self.report_tree.tag_configure('total', background='#e6f7ff', font=('Arial', 10, 'bold'))
-        else:
-            messagebox.showinfo("معلومة", "لا توجد بيانات للفترة المحددة")
+        except ValueError:
+            messagebox.showerror("خطأ", "صيغة التاريخ غير صحيحة. استخدم YYYY-MM-DD")
+            return
+        
+        def on_done(result):
+            self.show_report(result)
+            if not result.rows:
+                messagebox.showinfo("معلومة", "لا توجد بيانات للفترة المحددة")
+        
+        self.run_in_background(
+            "جاري حساب الرواتب...",
+            lambda cancel: build_payroll_report(
+                self.storage, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'), department,
+                f"{start_date_str} إلى {end_date_str}", cancel),
+            on_done)
     
     def export_pdf(self):
         """تصدير التقرير إلى PDF"""
-        if not self.report_tree.get_children():
+        if not self.report_rows:
             messagebox.showerror("خطأ", "لا توجد بيانات للتصدير")
             return
         
@@ -770,60 +1142,16 @@ class EmployeeAttendanceSystem:
         if not file_path:
             return
         
-        pdf = FPDF()
-        pdf.add_page()
-        
-        try:
-            pdf.add_font('Arial', '', 'arial.ttf', uni=True)
-            pdf.set_font('Arial', '', 12)
-        except:
-            pdf.set_font('Arial', '', 12)
-        
-        if self.report_type.get() == 'daily':
-            title = f"تقرير الحضور اليومي - {self.report_date.get()}"
-        else:
-            title = f"تقرير الحضور للفترة - {self.start_date.get()} إلى {self.end_date.get()} للموظف {self.monthly_emp_id.get()}"
-        
-        pdf.cell(0, 10, title, 0, 1, 'C')
-        pdf.ln(10)
-        
-        if self.report_type.get() == 'daily':
-            col_widths = [25, 35, 35, 35, 25, 25]
-            headers = ['كود الموظف', 'اسم الموظف', 'وقت الحضور', 'وقت الانصراف', 'الساعات', 'الراتب']
-        else:
-            col_widths = [35, 35, 35, 25, 25]
-            headers = ['التاريخ', 'وقت الحضور', 'وقت الانصراف', 'الساعات', 'الراتب']
-        
-        for i, header in enumerate(headers):
-            pdf.cell(col_widths[i], 10, header, 1, 0, 'C')
-        pdf.ln()
-        
-        for item in self.report_tree.get_children():
-            values = self.report_tree.item(item)['values']
-            
-            if "الإجمالي" in str(values[0]):
-                continue
-            
-            for i, value in enumerate(values):
-                pdf.cell(col_widths[i], 10, str(value), 1, 0, 'C')
-            pdf.ln()
-        
-        for item in self.report_tree.get_children():
-            values = self.report_tree.item(item)['values']
-            if "الإجمالي" in str(values[0]):
-                pdf.set_font('Arial', 'B', 12)
-                pdf.cell(sum(col_widths[:-2]), 10, "الإجمالي:", 1, 0, 'R')
-                pdf.cell(col_widths[-2], 10, str(values[-2]), 1, 0, 'C')
-                pdf.cell(col_widths[-1], 10, str(values[-1]), 1, 0, 'C')
-                pdf.set_font('Arial', '', 12)
-                break
-        
-        pdf.output(file_path)
-        messagebox.showinfo("تم", f"تم تصدير التقرير إلى {file_path}")
+        result = self.report_result
+        self.run_in_background(
+            "جاري التصدير إلى PDF...",
+            lambda cancel: write_pdf(file_path, result, cancel),
+            lambda _: messagebox.showinfo("تم", f"تم تصدير التقرير إلى {file_path}"),
+            needs_report_view=False)
     
     def export_excel(self):
         """تصدير التقرير إلى Excel"""
-        if not self.report_tree.get_children():
+        if not self.report_rows:
             messagebox.showerror("خطأ", "لا توجد بيانات للتصدير")
             return
         
@@ -836,25 +1164,12 @@ class EmployeeAttendanceSystem:
         if not file_path:
             return
         
-        data = []
-        columns = []
-        
-        if self.report_type.get() == 'daily':
-            columns = ['كود الموظف', 'اسم الموظف', 'وقت الحضور', 'وقت الانصراف', 'الساعات', 'الراتب']
-        else:
-            columns = ['التاريخ', 'وقت الحضور', 'وقت الانصراف', 'الساعات', 'الراتب']
-        
-        for item in self.report_tree.get_children():
-            values = self.report_tree.item(item)['values']
-            data.append(values)
-        
-        df = pd.DataFrame(data, columns=columns)
-        
-        try:
-            df.to_excel(file_path, index=False, engine='openpyxl')
-            messagebox.showinfo("تم", f"تم تصدير التقرير إلى {file_path}")
-        except Exception as e:
-            messagebox.showerror("خطأ", f"حدث خطأ أثناء التصدير: {str(e)}")
+        result = self.report_result
+        self.run_in_background(
+            "جاري التصدير إلى Excel...",
+            lambda cancel: write_excel(file_path, result, cancel),
+            lambda _: messagebox.showinfo("تم", f"تم تصدير التقرير إلى {file_path}"),
+            needs_report_view=False)
 
 # تشغيل التطبيق
 if __name__ == "__main__":